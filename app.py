@@ -1,7 +1,7 @@
 """Interface Streamlit para sincronização de clientes no Jettax 360."""
 from __future__ import annotations
 
-from io import BytesIO
+import time
 from pathlib import Path
 from typing import List
 
@@ -13,6 +13,7 @@ from src.services.client_sync import (
     DEFAULT_SPREADSHEET,
     SyncEntry,
     authenticate,
+    create_session,
     read_spreadsheet,
     save_report,
     sync_clients,
@@ -30,23 +31,46 @@ st.write(
 )
 
 
+@st.cache_resource
+def get_session() -> requests.Session:
+    """Sessão HTTP compartilhada entre execuções (keep-alive + pool de conexões)."""
+    return create_session()
+
+
+@st.cache_data(show_spinner=False)
+def _report_bytes(path_str: str, mtime: float) -> bytes:
+    """Conteúdo do relatório (cacheado por caminho + mtime)."""
+    return Path(path_str).read_bytes()
+
+
+# Intervalo mínimo (segundos) entre atualizações do painel de logs
+LOG_FLUSH_INTERVAL = 0.25
+
+
+_ACTION_PREFIX = {
+    "created": "🟢 Criado",
+    "updated": "🟡 Atualizado",
+    "skipped": "⚪ Ignorado",
+    "error": "🔴 Erro",
+}
+
+
+def format_log_line(entry: SyncEntry) -> str:
+    return f"{_ACTION_PREFIX.get(entry.action, '⚪')} {entry.cnpj} - {entry.message}"
+
+
 def render_logs(entries: List[SyncEntry]) -> str:
-    lines = []
-    for entry in entries:
-        prefix = {
-            "created": "🟢 Criado",
-            "updated": "🟡 Atualizado",
-            "skipped": "⚪ Ignorado",
-            "error": "🔴 Erro",
-        }.get(entry.action, "⚪")
-        lines.append(f"{prefix} {entry.cnpj} - {entry.message}")
-    return "\n".join(lines)
+    return "\n".join(format_log_line(entry) for entry in entries)
 
 
 with st.sidebar:
     st.header("Configurações")
     default_path = st.text_input("Caminho da planilha", value=DEFAULT_SPREADSHEET)
     dry_run = st.checkbox("Modo dry-run (não envia para API)", value=True)
+    workers = st.number_input(
+        "Requisições simultâneas", min_value=1, max_value=16, value=4, step=1,
+        help="Quantos cadastros/atualizações são enviados ao mesmo tempo",
+    )
     st.caption(
         "O modo dry-run registra tudo que seria feito sem alterar os clientes ou"
         " certificados."
@@ -59,7 +83,8 @@ summary_placeholder = st.empty()
 report_placeholder = st.empty()
 
 if st.button("Executar", type="primary"):
-    source = BytesIO(uploaded_file.read()) if uploaded_file else default_path
+    # UploadedFile é um buffer em memória; read_spreadsheet o reposiciona no início
+    source = uploaded_file or default_path
 
     try:
         df = read_spreadsheet(source)
@@ -71,16 +96,23 @@ if st.button("Executar", type="primary"):
     st.subheader("Pré-visualização da planilha normalizada")
     st.dataframe(df.head())
 
-    progress_entries: List[SyncEntry] = []
+    log_lines: List[str] = []
+    last_flush = [0.0]
 
     def on_progress(entry: SyncEntry) -> None:
-        progress_entries.append(entry)
-        log_placeholder.text(render_logs(progress_entries))
+        log_lines.append(format_log_line(entry))
+        now = time.monotonic()
+        if now - last_flush[0] > LOG_FLUSH_INTERVAL:
+            log_placeholder.text("\n".join(log_lines))
+            last_flush[0] = now
 
     with st.spinner("Executando sincronização..."):
         try:
-            session, _ = authenticate(requests.Session())
-            log = sync_clients(df, session, dry_run=dry_run, progress=on_progress)
+            session, _ = authenticate(get_session())
+            log = sync_clients(
+                df, session, dry_run=dry_run, progress=on_progress, max_workers=int(workers)
+            )
+            log_placeholder.text("\n".join(log_lines))
         except Exception as exc:  # pragma: no cover - feedback ao usuário
             st.error(f"Erro durante a sincronização: {exc}")
             st.stop()
@@ -93,7 +125,7 @@ if st.button("Executar", type="primary"):
     report_path = save_report(log)
     report_placeholder.download_button(
         label="Baixar relatório CSV",
-        data=report_path.read_bytes(),
+        data=_report_bytes(str(report_path), report_path.stat().st_mtime),
         file_name=report_path.name,
         mime="text/csv",
     )
@@ -5,16 +5,26 @@ relatórios, payloads e pré-visualizar a planilha de empresas.
 """
 from __future__ import annotations
 
-import json
-import subprocess
+import io
+import logging
+import os
+import queue
 import sys
+import threading
+import time
+from collections import deque
 from pathlib import Path
-from typing import Iterable, List, Optional
+from typing import Any, Iterable, List, Optional, Sequence
 
+import numpy as np
+import orjson
 import pandas as pd
 import streamlit as st
 from dotenv import load_dotenv
 
+from main import main as run_main
+from src.utils.logger import configurar_logger, get_logger
+
 BASE_DIR = Path(__file__).resolve().parent
 DEFAULT_PLANILHA = BASE_DIR / "RELAÇÃO DE EMPRESAS.xlsx"
 LOGS_DIR = BASE_DIR / "logs"
@@ -22,6 +32,29 @@ REPORTS_DIR = BASE_DIR / "reports"
 DEBUG_DIR = BASE_DIR / "debug_payloads"
 ENV_CANDIDATES = [BASE_DIR / "config" / ".env", BASE_DIR / ".env"]
 
+# Streaming da saída do main.py: linhas exibidas e intervalo mínimo entre repaints
+STREAM_DISPLAY_LINES = 500
+STREAM_FLUSH_INTERVAL = 0.1
+
+# Tamanho máximo (bytes) lido do final de logs/relatórios grandes
+FILE_TAIL_BYTES = 256_000
+
+# Colunas da planilha exibidas no painel (todas lidas como string)
+PLANILHA_COLUMNS = (
+    "CNPJ",
+    "Razao Social",
+    "Regime",
+    "Tributacao",
+    "IE",
+    "IM",
+    "NIRE",
+    "e-mail",
+    "Municipio",
+    "Data de Cadastro",
+    "Cadastro JETTAX",
+)
+PLANILHA_MAX_ROWS = 500
+
 
 # ---------------------------------------------------------------------------
 # Auxiliares
@@ -32,11 +65,52 @@ def list_files_safe(path: Path, patterns: Iterable[str] = ("*.log", "*.txt", "*.
     if not path.exists():
         return []
 
-    files: list[Path] = []
-    for pattern in patterns:
-        files.extend(path.glob(pattern))
+    # Padrões no formato "*.ext" viram sufixos: uma única varredura do diretório
+    suffixes = tuple(pattern.lstrip("*") for pattern in patterns)
+
+    entries: list[tuple[Path, float]] = []
+    with os.scandir(path) as it:
+        for entry in it:
+            if entry.name.endswith(suffixes) and entry.is_file():
+                entries.append((Path(entry.path), entry.stat().st_mtime))
+
+    entries.sort(key=lambda e: e[1], reverse=True)
+    return [file_path for file_path, _ in entries]
+
+
+@st.cache_data(ttl=5, show_spinner=False)
+def list_files_safe_cached(path_str: str, dir_mtime: float, patterns: tuple) -> List[Path]:
+    """Versão cacheada de list_files_safe (invalidada pelo mtime do diretório)."""
+    return list_files_safe(Path(path_str), patterns=patterns)
+
+
+def list_files(path: Path, patterns: Iterable[str]) -> List[Path]:
+    """Lista arquivos do diretório usando o cache quando possível."""
+    if not path.exists():
+        return []
+    return list_files_safe_cached(str(path), path.stat().st_mtime, tuple(patterns))
+
+
+@st.cache_data(show_spinner=False)
+def load_json(path_str: str, mtime: float) -> Optional[dict]:
+    """Lê e interpreta um JSON (cacheado por caminho + mtime); None se inválido."""
+    try:
+        return orjson.loads(Path(path_str).read_bytes())
+    except Exception:
+        return None
 
-    return sorted(files, key=lambda f: f.stat().st_mtime, reverse=True)
+
+@st.cache_data(show_spinner=False)
+def load_jsonl(path_str: str, mtime: float) -> List[dict]:
+    """Lê um arquivo JSONL (cacheado por caminho + mtime), ignorando linhas inválidas."""
+    records = []
+    with open(path_str, "rb") as fp:
+        for line in fp:
+            try:
+                records.append(orjson.loads(line))
+            except orjson.JSONDecodeError:
+                continue
+    return records
 
 
 def locate_env_file() -> Optional[Path]:
@@ -58,58 +132,163 @@ def load_env_if_available() -> Optional[Path]:
 def show_file_content(file_path: Path, is_json: bool = False) -> None:
     """Exibe conteúdo do arquivo como texto ou JSON."""
     try:
-        text = file_path.read_text(encoding="utf-8", errors="replace")
+        size = file_path.stat().st_size
+        # Arquivos de texto grandes: lê só o final, a menos que o usuário peça o arquivo completo
+        truncated = (
+            not is_json
+            and size > FILE_TAIL_BYTES
+            and not st.checkbox("Mostrar arquivo completo", key=f"full_{file_path}")
+        )
+        with open(file_path, "rb") as fp:
+            if truncated:
+                fp.seek(size - FILE_TAIL_BYTES)
+            raw = fp.read()
     except OSError as exc:  # pragma: no cover - fallback de leitura
         st.error(f"Erro ao ler arquivo: {exc}")
         return
 
     if is_json:
         try:
-            data = json.loads(text)
+            data = orjson.loads(raw)
             st.json(data)
             return
-        except json.JSONDecodeError:
+        except orjson.JSONDecodeError:
             st.warning("Não foi possível interpretar o JSON, exibindo texto bruto.")
 
+    text = raw.decode("utf-8", errors="replace")
+    if truncated:
+        # Descarta a primeira linha, provavelmente cortada no meio
+        text = text.split("\n", 1)[-1]
+        st.caption(f"Exibindo os últimos {FILE_TAIL_BYTES // 1000} KB de {size // 1000} KB.")
     st.code(text, language="json" if is_json else "text")
 
 
-def run_command_stream(command: List[str], workdir: Path) -> str:
-    """Executa comando mostrando saída em tempo quase real."""
-    placeholder = st.empty()
-    output_lines: list[str] = []
-
-    process = subprocess.Popen(
-        command,
-        cwd=workdir,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
-        text=True,
-        bufsize=1,
-    )
+class _QueueWriter(io.TextIOBase):
+    """Stream de texto que repassa cada escrita para uma fila."""
+
+    def __init__(self, chunks: "queue.Queue[str]"):
+        super().__init__()
+        self._chunks = chunks
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        if text:
+            self._chunks.put(text)
+        return len(text)
+
+
+# Uma execução do main.py por vez no servidor: o logger é global e a thread de uma
+# execução continua rodando mesmo quando um rerun do Streamlit interrompe o script
+_RUN_LOCK = threading.Lock()
 
-    assert process.stdout is not None  # para type checkers
-    for line in process.stdout:
-        output_lines.append(line)
-        placeholder.code("".join(output_lines))
 
-    process.wait()
-    full_output = "".join(output_lines)
+def run_main_stream(args: List[str]) -> str:
+    """Executa o main.py no próprio processo mostrando saída em tempo quase real."""
+    if not _RUN_LOCK.acquire(blocking=False):
+        st.warning("Já existe uma execução do main.py em andamento. Aguarde ela terminar.")
+        return ""
 
-    status = "sucesso" if process.returncode == 0 else f"erro (code {process.returncode})"
-    st.success(f"Execução finalizada com {status}.") if process.returncode == 0 else st.error(
+    placeholder = st.empty()
+    output_parts: list[str] = []
+    # Apenas as últimas linhas são exibidas; a saída completa fica em output_parts
+    display_lines: deque[str] = deque(maxlen=STREAM_DISPLAY_LINES)
+    chunks: queue.Queue[str] = queue.Queue()
+    writer = _QueueWriter(chunks)
+    result = {"returncode": 0}
+
+    # sys.stdout/stderr são do processo inteiro (todas as sessões): não são redirecionados.
+    # A saída do main.py (banner e tracebacks inclusive) passa pelo logger e chega ao
+    # painel por um handler temporário apontando para a fila
+    configurar_logger()
+    app_logger = get_logger()
+
+    def target() -> None:
+        handler = logging.StreamHandler(writer)
+        handler.setFormatter(logging.Formatter("[%(asctime)s] [%(levelname)s] %(message)s", "%Y-%m-%d %H:%M:%S"))
+        previous_level = app_logger.level
+        app_logger.setLevel(logging.DEBUG if "--debug" in args else logging.INFO)
+        app_logger.addHandler(handler)
+        try:
+            run_main(args)
+        except SystemExit as exc:
+            code = exc.code
+            result["returncode"] = code if isinstance(code, int) else (0 if code is None else 1)
+        finally:
+            app_logger.removeHandler(handler)
+            app_logger.setLevel(previous_level)
+            _RUN_LOCK.release()
+
+    thread = threading.Thread(target=target, name="jettax-main", daemon=True)
+    try:
+        thread.start()
+    except BaseException:
+        _RUN_LOCK.release()
+        raise
+
+    pending = ""
+    last_flush = 0.0
+    while thread.is_alive() or not chunks.empty():
+        try:
+            parts = [chunks.get(timeout=STREAM_FLUSH_INTERVAL)]
+        except queue.Empty:
+            continue
+        while not chunks.empty():
+            parts.append(chunks.get_nowait())
+
+        text = "".join(parts)
+        output_parts.append(text)
+
+        *lines, pending = (pending + text).split("\n")
+        display_lines.extend(lines)
+
+        now = time.monotonic()
+        if now - last_flush > STREAM_FLUSH_INTERVAL:
+            placeholder.code("\n".join([*display_lines, pending]))
+            last_flush = now
+
+    thread.join()
+    if pending:
+        display_lines.append(pending)
+    placeholder.code("\n".join(display_lines))
+    full_output = "".join(output_parts)
+
+    returncode = result["returncode"]
+    status = "sucesso" if returncode == 0 else f"erro (code {returncode})"
+    st.success(f"Execução finalizada com {status}.") if returncode == 0 else st.error(
         f"Execução finalizada com {status}."
     )
 
     return full_output
 
 
-def load_planilha(planilha_path: Path) -> pd.DataFrame:
-    """Carrega a planilha principal caso exista."""
-    if not planilha_path.exists():
-        raise FileNotFoundError(f"Planilha não encontrada: {planilha_path}")
+@st.cache_data(show_spinner=False)
+def load_planilha(path_str: str, mtime: float) -> pd.DataFrame:
+    """Carrega a planilha principal (cacheado por caminho + mtime)."""
+    # Tudo como texto: sem inferência de tipos (as colunas misturam números e texto)
+    df = pd.read_excel(
+        path_str,
+        sheet_name="RELAÇÃO DE EMPRESAS",
+        engine="calamine",
+        header=0,
+        dtype="string",
+    )
+
+    # A planilha começa com uma linha vazia, que vira o cabeçalho ("Unnamed: N"):
+    # o cabeçalho real está na primeira linha de dados, como no ExcelReader
+    if "CNPJ" not in df.columns:
+        df.columns = df.iloc[0]
+        df = df.iloc[1:].reset_index(drop=True)
 
-    return pd.read_excel(planilha_path, sheet_name="RELAÇÃO DE EMPRESAS")
+    return df[[col for col in PLANILHA_COLUMNS if col in df.columns]]
+
+
+@st.cache_data(show_spinner=False)
+def municipios_for(path_str: str, mtime: float) -> List[str]:
+    """Lista ordenada de municípios da planilha (cacheada por caminho + mtime)."""
+    df = load_planilha(path_str, mtime)
+    return sorted(df.get("Municipio", pd.Series(dtype=str)).dropna().unique().tolist())
 
 
 # ---------------------------------------------------------------------------
@@ -144,57 +323,71 @@ def sidebar_controls() -> dict:
     }
 
 
-def build_command(config: dict) -> List[str]:
-    cmd: List[str] = [sys.executable, "main.py", config["modo"], "--planilha", config["planilha"]]
+def build_args(config: dict) -> List[str]:
+    args: List[str] = [config["modo"], "--planilha", config["planilha"]]
 
     if config.get("dry_run"):
-        cmd.append("--dry-run")
+        args.append("--dry-run")
     if config.get("debug"):
-        cmd.append("--debug")
+        args.append("--debug")
     if config.get("limit"):
-        cmd.extend(["--limit", str(config["limit"])])
+        args.extend(["--limit", str(config["limit"])])
     if config.get("intervalo"):
-        cmd.extend(["--intervalo", str(config["intervalo"])])
+        args.extend(["--intervalo", str(config["intervalo"])])
+
+    return args
 
-    return cmd
+
+def build_command(args: List[str]) -> List[str]:
+    """Linha de comando equivalente (apenas para exibição)."""
+    return [sys.executable, "main.py", *args]
 
 
 def render_planilha_tab(planilha_path: Path) -> None:
     st.subheader("Planilha de Empresas")
     try:
-        df = load_planilha(planilha_path)
+        if not planilha_path.exists():
+            raise FileNotFoundError(f"Planilha não encontrada: {planilha_path}")
+        mtime = planilha_path.stat().st_mtime
+        df = load_planilha(str(planilha_path), mtime)
     except Exception as exc:
         st.error(f"Não foi possível carregar a planilha: {exc}")
         return
 
-    col1, col2, col3 = st.columns(3)
-    with col1:
-        filtro_cnpj = st.text_input("Filtrar CNPJ")
-    with col2:
-        filtro_razao = st.text_input("Filtrar Razão Social")
-    with col3:
-        municipios = sorted(df.get("Municipio", pd.Series(dtype=str)).dropna().unique().tolist())
-        municipio_sel = st.selectbox("Municipio", ["(Todos)"] + municipios)
-
-    filtered = df.copy()
+    # Filtros dentro de um form: os valores só mudam (e disparam rerun) ao clicar em Aplicar
+    with st.form("filtros_planilha"):
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            filtro_cnpj = st.text_input("Filtrar CNPJ", key="filtro_cnpj")
+        with col2:
+            filtro_razao = st.text_input("Filtrar Razão Social", key="filtro_razao")
+        with col3:
+            municipios = municipios_for(str(planilha_path), mtime)
+            municipio_sel = st.selectbox("Municipio", ["(Todos)"] + municipios, key="filtro_municipio")
+        st.form_submit_button("Aplicar")
+
+    mask = np.ones(len(df), dtype=bool)
     if filtro_cnpj:
-        filtered = filtered[filtered["CNPJ"].astype(str).str.contains(filtro_cnpj, case=False, na=False)]
+        mask &= df["CNPJ"].str.contains(filtro_cnpj, case=False, na=False, regex=False).to_numpy(dtype=bool)
     if filtro_razao:
-        filtered = filtered[filtered["Razao Social"].astype(str).str.contains(filtro_razao, case=False, na=False)]
+        mask &= df["Razao Social"].str.contains(filtro_razao, case=False, na=False, regex=False).to_numpy(dtype=bool)
     if municipio_sel and municipio_sel != "(Todos)":
-        filtered = filtered[filtered["Municipio"].astype(str) == municipio_sel]
+        mask &= (df["Municipio"] == municipio_sel).fillna(False).to_numpy(dtype=bool)
 
-    st.markdown(f"Empresas filtradas: **{len(filtered)}** de **{len(df)}**")
-    st.dataframe(filtered.head(500))
+    # Materializa apenas as linhas exibidas; o total vem direto da máscara
+    idx = np.flatnonzero(mask)[:PLANILHA_MAX_ROWS]
 
+    st.markdown(f"Empresas filtradas: **{int(mask.sum())}** de **{len(df)}**")
+    st.dataframe(df.iloc[idx])
 
-def render_execucao_tab(command: List[str]) -> None:
+
+def render_execucao_tab(args: List[str]) -> None:
     st.subheader("Execução")
-    st.code(" ".join(command), language="bash")
+    st.code(" ".join(build_command(args)), language="bash")
 
     if st.button("🚀 Executar automação", type="primary"):
         with st.spinner("Executando automação..."):
-            output = run_command_stream(command, BASE_DIR)
+            output = run_main_stream(args)
             st.text_area("Saída completa", value=output, height=300)
     else:
         st.info("Configure os parâmetros na sidebar e clique em Executar.")
@@ -202,7 +395,7 @@ def render_execucao_tab(command: List[str]) -> None:
 
 def render_logs_tab(path: Path, title: str, patterns: Iterable[str]) -> None:
     st.subheader(title)
-    files = list_files_safe(path, patterns=patterns)
+    files = list_files(path, patterns)
     if not files:
         st.info("Nenhum arquivo encontrado.")
         return
@@ -212,25 +405,41 @@ def render_logs_tab(path: Path, title: str, patterns: Iterable[str]) -> None:
         show_file_content(selected, is_json=False)
 
 
-def summarize_payload(data: dict) -> str:
-    cnpj = data.get("cnpj") or data.get("empresa", {}).get("cnpj")
-    status = data.get("status") or data.get("resultado")
-    endpoint = data.get("endpoint") or data.get("url") or data.get("operacao")
-
-    parts = []
-    if cnpj:
-        parts.append(f"**CNPJ:** {cnpj}")
-    if status:
-        parts.append(f"**Status:** {status}")
-    if endpoint:
-        parts.append(f"**Endpoint/Op.:** {endpoint}")
+CNPJ_KEYS = ("cnpj",)
+STATUS_KEYS = ("status", "resultado")
+ENDPOINT_KEYS = ("endpoint", "url", "operacao")
+
+
+def _first(d: dict, keys: Sequence[str], nested: Optional[str] = None) -> Optional[Any]:
+    """Retorna o primeiro valor verdadeiro entre `keys`, opcionalmente caindo para d[nested]."""
+    for key in keys:
+        value = d.get(key)
+        if value:
+            return value
+    if nested is None:
+        return None
+    inner = d.get(nested)
+    if not isinstance(inner, dict):
+        return None
+    return _first(inner, keys)
+
 
+def summarize_payload(data: dict) -> str:
+    cnpj = _first(data, CNPJ_KEYS, nested="empresa")
+    status = _first(data, STATUS_KEYS)
+    endpoint = _first(data, ENDPOINT_KEYS)
+
+    parts = [
+        f"**{label}:** {value}"
+        for label, value in (("CNPJ", cnpj), ("Status", status), ("Endpoint/Op.", endpoint))
+        if value
+    ]
     return "\n".join(parts) if parts else "Sem metadados detectados."
 
 
 def render_debug_tab(path: Path) -> None:
     st.subheader("Debug Payloads")
-    files = list_files_safe(path, patterns=("*.json",))
+    files = list_files(path, ("*.json", "*.jsonl"))
     if not files:
         st.info("Nenhum payload encontrado.")
         return
@@ -239,11 +448,20 @@ def render_debug_tab(path: Path) -> None:
     if not selected:
         return
 
-    try:
-        content = selected.read_text(encoding="utf-8", errors="replace")
-        data = json.loads(content)
-    except Exception:
-        data = None
+    if selected.suffix == ".jsonl":
+        # Um arquivo por dia com um payload por linha: escolher o registro
+        records = load_jsonl(str(selected), selected.stat().st_mtime)
+        if not records:
+            st.info("Arquivo sem payloads.")
+            return
+        index = st.selectbox(
+            "Registro",
+            range(len(records)),
+            format_func=lambda i: f"{i + 1}. {records[i].get('cnpj', '')} - {records[i].get('razao_social', '')}",
+        )
+        data = records[index]
+    else:
+        data = load_json(str(selected), selected.stat().st_mtime)
 
     col_meta, col_json = st.columns([1, 2])
     with col_meta:
@@ -276,18 +494,18 @@ def main() -> None:
     config = sidebar_controls()
     planilha_path = Path(config["planilha"]) if config["planilha"] else DEFAULT_PLANILHA
     config["planilha"] = str(planilha_path)
-    command = build_command(config)
+    args = build_args(config)
 
     tabs = st.tabs(["Execução", "Logs", "Relatórios", "Debug Payloads", "Planilha de Empresas"])
 
     with tabs[0]:
-        render_execucao_tab(command)
+        render_execucao_tab(args)
 
     with tabs[1]:
         render_logs_tab(LOGS_DIR, "Logs", patterns=("*.log", "*.txt"))
 
     with tabs[2]:
-        render_logs_tab(REPORTS_DIR, "Relatórios", patterns=("*.txt", "*.log"))
+        render_logs_tab(REPORTS_DIR, "Relatórios", patterns=("*.txt", "*.jsonl", "*.log"))
 
     with tabs[3]:
         render_debug_tab(DEBUG_DIR)
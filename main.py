@@ -7,23 +7,35 @@ Data: 2025-11-21
 """
 import os
 import sys
+import shutil
 import argparse
+import tempfile
+from dataclasses import dataclass
 from pathlib import Path
 from datetime import datetime
-from typing import List
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import orjson
 
 # Adicionar diretório raiz ao path
 ROOT_DIR = Path(__file__).parent
 sys.path.insert(0, str(ROOT_DIR))
 
+# Diretório dos relatórios (criado na importação, para a primeira execução não falhar)
+REPORTS_DIR = ROOT_DIR / "reports"
+REPORTS_DIR.mkdir(parents=True, exist_ok=True)
+
 from src.core.api_client import JettaxAPI
-from src.core.excel_reader import ExcelReader
+from src.core.excel_reader import ENGINES, ExcelReader
 from src.models.empresa import Empresa
+from src.models.stats import AtualizacaoStats, CadastroStats, ModulosStats, SyncStats
 from src.services.cadastro_service import CadastroService
 from src.services.atualizacao_service import AtualizacaoService
 from src.services.comparacao_service import ComparacaoService
 from src.services.modulo_service import ModuloService
+from src.utils.cnpj_utils import formatar_cnpj
 from src.utils.logger import get_logger, configurar_logger
+from src.utils.lote import ProgressoLog
 
 logger = get_logger()
 
@@ -58,7 +70,7 @@ Exemplos de uso:
     
     parser.add_argument(
         "modo",
-        choices=["cadastro", "atualizacao", "sync", "comparar", "modulos"],
+        choices=list(MODES),
         help="Modo de operação: cadastro (criar novos), atualizacao (atualizar existentes), sync (cadastro+atualizacao+modulos), comparar (apenas listar diferenças), modulos (configurar módulos Federal e Serviços)"
     )
     
@@ -85,7 +97,14 @@ Exemplos de uso:
         "--intervalo",
         type=float,
         default=1.0,
-        help="Intervalo entre requisições em segundos (default: 1.0)"
+        help="Intervalo mínimo entre o início de duas empresas, em segundos (default: 1.0)"
+    )
+    
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=4,
+        help="Empresas processadas simultaneamente; 1 processa em sequência (default: 4)"
     )
     
     parser.add_argument(
@@ -95,52 +114,186 @@ Exemplos de uso:
         help="Limitar processamento às primeiras N empresas"
     )
     
+    parser.add_argument(
+        "--engine",
+        choices=ENGINES,
+        default="calamine",
+        help="Engine de leitura da planilha (default: calamine)"
+    )
+    
+    parser.add_argument(
+        "--sem-copia-local",
+        action="store_true",
+        help="Ler a planilha direto do caminho informado, sem copiá-la antes para o diretório temporário"
+    )
+    
+    parser.add_argument(
+        "--manter-duplicados",
+        action="store_true",
+        help="Processar todas as linhas, mesmo com CNPJ repetido (por padrão só a primeira é usada)"
+    )
+    
+    parser.add_argument(
+        "--debug-payloads",
+        action="store_true",
+        help="Registrar cada payload de atualização enviado em debug_payloads/YYYYMMDD.jsonl"
+    )
+    
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Pular empresas sem mudança na planilha nem no JETTAX desde a última sincronização"
+    )
+    
+    parser.add_argument(
+        "--sem-relatorio-txt",
+        action="store_true",
+        help="Gravar apenas o relatório JSONL (sem o relatório em texto)"
+    )
+    
     return parser
 
 
 def imprimir_banner():
-    """Imprime banner do sistema"""
-    print("\n" + "=" * 70)
-    print("  SISTEMA DE AUTOMAÇÃO JETTAX 360")
-    print("  Cadastro e Atualização de Clientes")
-    print("=" * 70 + "\n")
+    """Imprime banner do sistema (pelo logger, para chegar a todos os handlers, inclusive o do painel)"""
+    logger.info(
+        "\n%s\n  SISTEMA DE AUTOMAÇÃO JETTAX 360\n  Cadastro e Atualização de Clientes\n%s\n",
+        "=" * 70,
+        "=" * 70,
+    )
 
 
-def carregar_empresas(caminho_planilha: str, limit: int = None) -> List[Empresa]:
+def _copia_local(caminho: Path) -> Path:
+    """
+    Copia a planilha para o diretório temporário quando ela está em outro drive
+    ou em um compartilhamento de rede
+    
+    A leitura do Excel faz muitas leituras pequenas, e cada uma paga a latência
+    da rede; copiar o arquivo inteiro uma vez e ler localmente é bem mais rápido.
+    
+    Returns:
+        Caminho a ser lido (a cópia local ou o próprio caminho)
+    """
+    # Caminho relativo não tem drive: resolver antes de comparar
+    absoluto = caminho.resolve()
+    remoto = absoluto.drive != ROOT_DIR.resolve().drive or absoluto.drive.startswith("\\\\")
+    if not remoto or not absoluto.is_file():
+        return caminho
+    
+    # Nome único por execução: execuções simultâneas não sobrescrevem a cópia uma da outra
+    fd, nome = tempfile.mkstemp(prefix="jettax_", suffix=caminho.suffix)
+    os.close(fd)
+    destino = Path(nome)
+    try:
+        shutil.copyfile(absoluto, destino)
+    except OSError:
+        destino.unlink(missing_ok=True)
+        raise
+    logger.debug(f"Planilha copiada para {destino} ({absoluto.stat().st_size / 1024:.0f} KB)")
+    return destino
+
+
+@dataclass
+class Carga:
+    """Empresas carregadas da planilha e o índice por CNPJ (14 dígitos)"""
+    empresas: List[Empresa]
+    por_cnpj: Dict[str, Empresa]
+
+
+def carregar_empresas(
+    caminho_planilha: str,
+    limit: int = None,
+    engine: str = "calamine",
+    copia_local: bool = True,
+    remover_duplicados: bool = True
+) -> Carga:
     """
     Carrega empresas da planilha
     
     Args:
         caminho_planilha: Caminho da planilha
         limit: Limitar número de empresas (para testes)
+        engine: Engine de leitura da planilha
+        copia_local: Copiar planilhas remotas para o diretório temporário antes de ler
+        remover_duplicados: Manter só a primeira linha de cada CNPJ repetido
     
     Returns:
-        Lista de empresas
+        Carga com a lista de empresas e o índice por CNPJ
     """
     logger.info(f"Carregando planilha: {caminho_planilha}")
     
-    reader = ExcelReader(caminho_planilha)
-    empresas = reader.converter_para_empresas()
+    caminho = Path(caminho_planilha)
+    leitura = _copia_local(caminho) if copia_local else caminho
+    
+    try:
+        reader = ExcelReader(str(leitura), engine=engine)
+        empresas = reader.converter_para_empresas()
+    finally:
+        # A cópia temporária só serve para esta leitura
+        if leitura != caminho:
+            leitura.unlink(missing_ok=True)
+    
+    # Índice montado uma única vez; em CNPJs repetidos vale a primeira ocorrência
+    por_cnpj: Dict[str, Empresa] = {}
+    for empresa in empresas:
+        if por_cnpj.setdefault(empresa.cnpj, empresa) is not empresa:
+            logger.warning(f"⚠ CNPJ duplicado na planilha: {formatar_cnpj(empresa.cnpj)} - {empresa.razao_social}")
+    
+    # Evita cadastrar/atualizar o mesmo CNPJ duas vezes
+    if remover_duplicados and len(por_cnpj) < len(empresas):
+        logger.warning(f"⚠ {len(empresas) - len(por_cnpj)} linhas duplicadas ignoradas")
+        empresas = list(por_cnpj.values())
     
     # Aplicar limite se especificado
     if limit and limit > 0:
         logger.warning(f"⚠ Limitando processamento às primeiras {limit} empresas")
         empresas = empresas[:limit]
+        mantidos = {empresa.cnpj for empresa in empresas}
+        por_cnpj = {cnpj: empresa for cnpj, empresa in por_cnpj.items() if cnpj in mantidos}
     
     logger.info(f"✓ {len(empresas)} empresas carregadas\n")
     
-    return empresas
+    return Carga(empresas=empresas, por_cnpj=por_cnpj)
+
+
+def _parear_empresas_com_clientes(
+    empresas: List[Empresa],
+    jettax_por_cnpj: Dict[str, Dict[str, Any]]
+) -> List[Tuple[Empresa, Dict[str, Any]]]:
+    """
+    Associa cada empresa da planilha ao seu cliente no JETTAX
+    
+    Percorre as linhas carregadas (Carga.empresas), não o índice por CNPJ: com
+    --manter-duplicados as linhas repetidas também são pareadas, como nos demais modos.
+    
+    Returns:
+        Lista de tuplas (empresa, cliente), na ordem da planilha
+    """
+    return [
+        (empresa, jettax_por_cnpj[empresa.cnpj])
+        for empresa in empresas
+        if empresa.cnpj in jettax_por_cnpj
+    ]
 
 
-def modo_cadastro(args):
+def modo_cadastro(args, api: JettaxAPI):
     """Executa modo cadastro"""
     logger.info("MODO: CADASTRO DE NOVOS CLIENTES\n")
     
     # Carregar empresas
-    empresas = carregar_empresas(args.planilha, args.limit)
+    carga = carregar_empresas(
+        args.planilha,
+        args.limit,
+        engine=args.engine,
+        copia_local=not args.sem_copia_local,
+        remover_duplicados=not args.manter_duplicados
+    )
     
-    # Criar cliente API
-    api = JettaxAPI()
+    # Nenhuma empresa válida na planilha: nada a fazer, evita requisições à API
+    if not carga.empresas:
+        logger.warning("⚠ Nenhuma empresa para processar")
+        return {}
+    empresas = carga.empresas
     
     # Criar serviço de cadastro
     cadastro_service = CadastroService(api, dry_run=args.dry_run)
@@ -148,53 +301,85 @@ def modo_cadastro(args):
     # Executar cadastro em lote
     stats = cadastro_service.cadastrar_em_lote(
         empresas,
-        intervalo_segundos=args.intervalo
+        intervalo_segundos=args.intervalo,
+        max_workers=args.workers,
+        progress=ProgressoLog("Cadastro", logger)
     )
     
     # Salvar relatório
-    salvar_relatorio_cadastro(stats)
+    salvar_relatorio_cadastro(stats, texto=not args.sem_relatorio_txt)
     
     return stats
 
 
-def modo_atualizacao(args):
+def modo_atualizacao(args, api: JettaxAPI):
     """Executa modo atualização"""
     logger.info("MODO: ATUALIZAÇÃO DE CLIENTES EXISTENTES\n")
     
     # Carregar empresas
-    empresas = carregar_empresas(args.planilha, args.limit)
+    carga = carregar_empresas(
+        args.planilha,
+        args.limit,
+        engine=args.engine,
+        copia_local=not args.sem_copia_local,
+        remover_duplicados=not args.manter_duplicados
+    )
     
-    # Criar cliente API
-    api = JettaxAPI()
+    # Nenhuma empresa válida na planilha: nada a fazer, evita requisições à API
+    if not carga.empresas:
+        logger.warning("⚠ Nenhuma empresa para processar")
+        return {}
+    empresas = carga.empresas
     
     # Criar serviço de atualização
-    atualizacao_service = AtualizacaoService(api, dry_run=args.dry_run)
+    atualizacao_service = AtualizacaoService(
+        api,
+        dry_run=args.dry_run,
+        debug_payloads=args.debug_payloads,
+        incremental=args.incremental,
+    )
     
     # Executar atualização em lote
     stats = atualizacao_service.atualizar_em_lote(
         empresas,
-        intervalo_segundos=args.intervalo
+        intervalo_segundos=args.intervalo,
+        max_workers=args.workers,
+        progress=ProgressoLog("Atualização", logger)
     )
     
     # Salvar relatório
-    salvar_relatorio_atualizacao(stats)
+    salvar_relatorio_atualizacao(stats, texto=not args.sem_relatorio_txt)
     
     return stats
 
 
-def modo_sync(args):
+def modo_sync(args, api: JettaxAPI):
     """Executa modo sync (cadastro + atualização + módulos)"""
     logger.info("MODO: SYNC COMPLETO (CADASTRO + ATUALIZAÇÃO + MÓDULOS)\n")
     
     # Carregar empresas
-    empresas = carregar_empresas(args.planilha, args.limit)
+    carga = carregar_empresas(
+        args.planilha,
+        args.limit,
+        engine=args.engine,
+        copia_local=not args.sem_copia_local,
+        remover_duplicados=not args.manter_duplicados
+    )
     
-    # Criar cliente API
-    api = JettaxAPI()
+    # Nenhuma empresa válida na planilha: nada a fazer, evita requisições à API
+    if not carga.empresas:
+        logger.warning("⚠ Nenhuma empresa para processar")
+        return {}
+    empresas = carga.empresas
     
     # Criar serviços
     cadastro_service = CadastroService(api, dry_run=args.dry_run)
-    atualizacao_service = AtualizacaoService(api, dry_run=args.dry_run)
+    atualizacao_service = AtualizacaoService(
+        api,
+        dry_run=args.dry_run,
+        debug_payloads=args.debug_payloads,
+        incremental=args.incremental,
+    )
     modulo_service = ModuloService(api, dry_run=args.dry_run)
     
     # 1. Cadastrar novos
@@ -204,7 +389,9 @@ def modo_sync(args):
     
     stats_cadastro = cadastro_service.cadastrar_em_lote(
         empresas,
-        intervalo_segundos=args.intervalo
+        intervalo_segundos=args.intervalo,
+        max_workers=args.workers,
+        progress=ProgressoLog("Cadastro", logger)
     )
     
     # 2. Atualizar existentes
@@ -214,7 +401,9 @@ def modo_sync(args):
     
     stats_atualizacao = atualizacao_service.atualizar_em_lote(
         empresas,
-        intervalo_segundos=args.intervalo
+        intervalo_segundos=args.intervalo,
+        max_workers=args.workers,
+        progress=ProgressoLog("Atualização", logger)
     )
     
     # 3. Configurar módulos
@@ -222,49 +411,53 @@ def modo_sync(args):
     logger.info("FASE 3: CONFIGURAÇÃO DE MÓDULOS")
     logger.info("=" * 60 + "\n")
     
-    # Carregar clientes do JETTAX
-    clientes = api.listar_todos_clientes()
-    
-    # Criar lista de (empresa, cliente)
-    from src.utils.cnpj_utils import somente_digitos
-    jettax_por_cnpj = {}
-    for cliente in clientes:
-        cnpj = somente_digitos(str(cliente.get("document", "")))
-        jettax_por_cnpj[cnpj] = cliente
-    
-    empresas_com_clientes = []
-    for empresa in empresas:
-        cnpj = somente_digitos(empresa.cnpj)
-        if cnpj in jettax_por_cnpj:
-            empresas_com_clientes.append((empresa, jettax_por_cnpj[cnpj]))
+    # Carregar clientes do JETTAX e criar lista de (empresa, cliente)
+    empresas_com_clientes = _parear_empresas_com_clientes(carga.empresas, api.indice_clientes())
     
-    stats_modulos = modulo_service.configurar_modulos_em_lote(empresas_com_clientes)
+    if empresas_com_clientes:
+        stats_modulos = modulo_service.configurar_modulos_em_lote(
+            empresas_com_clientes,
+            max_workers=args.workers,
+            progress=ProgressoLog("Módulos", logger)
+        )
+    else:
+        logger.warning("⚠ Nenhuma empresa da planilha encontrada no JETTAX")
+        stats_modulos = None
     
     # Relatório consolidado
-    stats_consolidado = {
+    stats_consolidado: SyncStats = {
         "cadastro": stats_cadastro,
         "atualizacao": stats_atualizacao,
         "modulos": stats_modulos
     }
     
-    salvar_relatorio_sync(stats_consolidado)
+    salvar_relatorio_sync(stats_consolidado, texto=not args.sem_relatorio_txt)
     
     return stats_consolidado
 
 
-def modo_comparar(args):
+def modo_comparar(args, api: JettaxAPI):
     """Executa modo comparação (apenas lista diferenças)"""
     logger.info("MODO: COMPARAÇÃO (APENAS DIFERENÇAS)\n")
     
     # Carregar empresas
-    empresas = carregar_empresas(args.planilha, args.limit)
+    carga = carregar_empresas(
+        args.planilha,
+        args.limit,
+        engine=args.engine,
+        copia_local=not args.sem_copia_local,
+        remover_duplicados=not args.manter_duplicados
+    )
     
-    # Criar cliente API
-    api = JettaxAPI()
+    # Nenhuma empresa válida na planilha: nada a fazer, evita requisições à API
+    if not carga.empresas:
+        logger.warning("⚠ Nenhuma empresa para processar")
+        return {}
+    empresas = carga.empresas
     
     # Carregar clientes do JETTAX
     logger.info("Carregando clientes do JETTAX...")
-    clientes = api.listar_todos_clientes()
+    clientes = api.indice_clientes()
     
     # Comparar
     comparador = ComparacaoService()
@@ -275,214 +468,266 @@ def modo_comparar(args):
     logger.info("EMPRESAS COM DIVERGÊNCIAS")
     logger.info("=" * 60 + "\n")
     
+    # Um único registro para a listagem inteira, em vez de um por linha
+    linhas = []
     for empresa, cliente, diferencas in divergentes:
-        from src.utils.cnpj_utils import formatar_cnpj
-        
-        logger.info(f"{formatar_cnpj(empresa.cnpj)} - {empresa.razao_social}")
-        for diff in diferencas:
-            logger.info(f"  - {diff}")
-        logger.info("")
+        linhas.append(f"{formatar_cnpj(empresa.cnpj)} - {empresa.razao_social}")
+        linhas.extend(f"  - {diff}" for diff in diferencas)
+        linhas.append("")
+    
+    if linhas:
+        logger.info("\n".join(linhas))
     
     logger.info(f"Total de empresas com divergências: {len(divergentes)}")
     
     return {"divergentes": len(divergentes)}
 
 
-def modo_modulos(args):
+def modo_modulos(args, api: JettaxAPI):
     """Executa modo configuração de módulos"""
     logger.info("MODO: CONFIGURAÇÃO DE MÓDULOS\n")
     
     # Carregar empresas
-    empresas = carregar_empresas(args.planilha, args.limit)
+    carga = carregar_empresas(
+        args.planilha,
+        args.limit,
+        engine=args.engine,
+        copia_local=not args.sem_copia_local,
+        remover_duplicados=not args.manter_duplicados
+    )
     
-    # Criar cliente API
-    api = JettaxAPI()
+    # Nenhuma empresa válida na planilha: nada a fazer, evita requisições à API
+    if not carga.empresas:
+        logger.warning("⚠ Nenhuma empresa para processar")
+        return {}
     
-    # Carregar clientes do JETTAX
+    # Carregar clientes do JETTAX e criar lista de (empresa, cliente)
     logger.info("Carregando clientes do JETTAX...")
-    clientes = api.listar_todos_clientes()
-    
-    # Criar lista de (empresa, cliente)
-    from src.utils.cnpj_utils import somente_digitos
-    jettax_por_cnpj = {}
-    for cliente in clientes:
-        cnpj = somente_digitos(str(cliente.get("document", "")))
-        jettax_por_cnpj[cnpj] = cliente
-    
-    empresas_com_clientes = []
-    for empresa in empresas:
-        cnpj = somente_digitos(empresa.cnpj)
-        if cnpj in jettax_por_cnpj:
-            empresas_com_clientes.append((empresa, jettax_por_cnpj[cnpj]))
+    empresas_com_clientes = _parear_empresas_com_clientes(carga.empresas, api.indice_clientes())
     
     logger.info(f"✓ {len(empresas_com_clientes)} empresas encontradas no JETTAX\n")
     
+    if not empresas_com_clientes:
+        return {}
+    
     # Configurar módulos
     modulo_service = ModuloService(api, dry_run=args.dry_run)
-    stats = modulo_service.configurar_modulos_em_lote(empresas_com_clientes)
+    stats = modulo_service.configurar_modulos_em_lote(
+        empresas_com_clientes,
+        max_workers=args.workers,
+        progress=ProgressoLog("Módulos", logger)
+    )
     
     # Salvar relatório
-    salvar_relatorio_modulos(stats)
+    salvar_relatorio_modulos(stats, texto=not args.sem_relatorio_txt)
     
     return stats
 
 
-def salvar_relatorio_cadastro(stats: dict):
-    """Salva relatório de cadastro"""
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    arquivo = ROOT_DIR / "reports" / f"cadastro_{timestamp}.txt"
-    
-    with open(arquivo, "w", encoding="utf-8") as f:
-        f.write("RELATÓRIO DE CADASTRO\n")
-        f.write("=" * 60 + "\n\n")
-        f.write(f"Data: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}\n\n")
-        f.write(f"Total: {stats['total']}\n")
-        f.write(f"✓ Cadastrados: {stats['sucesso']}\n")
-        f.write(f"⚠ Já existiam: {stats['ja_cadastrados']}\n")
-        f.write(f"✗ Erros: {stats['erros']}\n\n")
-        f.write("=" * 60 + "\n")
-        f.write("DETALHES\n")
-        f.write("=" * 60 + "\n\n")
-        
-        for detalhe in stats['detalhes']:
-            f.write(f"{detalhe['cnpj']} - {detalhe['razao_social']}\n")
-            f.write(f"  Status: {'✓ OK' if detalhe['sucesso'] else '✗ ERRO'}\n")
-            f.write(f"  Mensagem: {detalhe['mensagem']}\n\n")
+def _salvar_relatorio(arquivo: Path, parts: List[str], detalhes: Iterable[dict], texto: bool = True):
+    """
+    Grava o relatório em texto e os detalhes em JSONL (um registro por linha)
+    
+    Args:
+        arquivo: Caminho do relatório .txt (o .jsonl é gravado ao lado)
+        parts: Trechos do relatório em texto
+        detalhes: Registros de detalhe de cada empresa
+        texto: Se False, grava apenas o JSONL
+    """
+    if texto:
+        arquivo.write_text("".join(parts), encoding="utf-8")
+        logger.info(f"\n✓ Relatório salvo em: {arquivo}")
     
-    logger.info(f"\n✓ Relatório salvo em: {arquivo}")
+    arquivo_jsonl = arquivo.with_suffix(".jsonl")
+    arquivo_jsonl.write_bytes(b"".join(orjson.dumps(detalhe) + b"\n" for detalhe in detalhes))
+    logger.info(f"✓ Detalhes salvos em: {arquivo_jsonl}")
+
 
+def _detalhes_sync(*stats_fases: Optional[dict]) -> Iterable[dict]:
+    """Detalhes de todas as fases do sync, marcados com o nome da fase"""
+    for fase, stats in zip(("cadastro", "atualizacao", "modulos"), stats_fases):
+        if stats:
+            for detalhe in stats['detalhes']:
+                yield {"fase": fase, **detalhe}
 
-def salvar_relatorio_atualizacao(stats: dict):
+
+def salvar_relatorio_cadastro(stats: CadastroStats, texto: bool = True):
+    """Salva relatório de cadastro"""
+    agora = datetime.now()
+    timestamp = agora.strftime("%Y%m%d_%H%M%S")
+    arquivo = REPORTS_DIR / f"cadastro_{timestamp}.txt"
+    
+    parts = [
+        "RELATÓRIO DE CADASTRO\n",
+        "=" * 60 + "\n\n",
+        f"Data: {agora.strftime('%d/%m/%Y %H:%M:%S')}\n\n",
+        f"Total: {stats['total']}\n"
+        f"✓ Cadastrados: {stats['sucesso']}\n"
+        f"⚠ Já existiam: {stats['ja_cadastrados']}\n"
+        f"✗ Erros: {stats['erros']}\n\n",
+        "=" * 60 + "\nDETALHES\n" + "=" * 60 + "\n\n",
+    ]
+    
+    for detalhe in stats['detalhes']:
+        parts.append(
+            f"{detalhe['cnpj']} - {detalhe['razao_social']}\n"
+            f"  Status: {'✓ OK' if detalhe['sucesso'] else '✗ ERRO'}\n"
+            f"  Mensagem: {detalhe['mensagem']}\n\n"
+        )
+    
+    _salvar_relatorio(arquivo, parts, stats['detalhes'], texto)
+
+
+def salvar_relatorio_atualizacao(stats: AtualizacaoStats, texto: bool = True):
     """Salva relatório de atualização"""
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    arquivo = ROOT_DIR / "reports" / f"atualizacao_{timestamp}.txt"
-    
-    with open(arquivo, "w", encoding="utf-8") as f:
-        f.write("RELATÓRIO DE ATUALIZAÇÃO\n")
-        f.write("=" * 60 + "\n\n")
-        f.write(f"Data: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}\n\n")
-        f.write(f"Total: {stats['total']}\n")
-        f.write(f"✓ Atualizados: {stats['atualizados']}\n")
-        f.write(f"= Sem alteração: {stats['sem_alteracao']}\n")
-        f.write(f"⚠ Não cadastrados: {stats['nao_cadastrados']}\n")
-        f.write(f"✗ Erros: {stats['erros']}\n\n")
-        f.write("=" * 60 + "\n")
-        f.write("DETALHES\n")
-        f.write("=" * 60 + "\n\n")
+    agora = datetime.now()
+    timestamp = agora.strftime("%Y%m%d_%H%M%S")
+    arquivo = REPORTS_DIR / f"atualizacao_{timestamp}.txt"
+    
+    parts = [
+        "RELATÓRIO DE ATUALIZAÇÃO\n",
+        "=" * 60 + "\n\n",
+        f"Data: {agora.strftime('%d/%m/%Y %H:%M:%S')}\n\n",
+        f"Total: {stats['total']}\n"
+        f"✓ Atualizados: {stats['atualizados']}\n"
+        f"= Sem alteração: {stats['sem_alteracao']}\n"
+        f"⚠ Não cadastrados: {stats['nao_cadastrados']}\n"
+        f"✗ Erros: {stats['erros']}\n\n",
+        "=" * 60 + "\nDETALHES\n" + "=" * 60 + "\n\n",
+    ]
+    
+    for detalhe in stats['detalhes']:
+        parts.append(
+            f"{detalhe['cnpj']} - {detalhe['razao_social']}\n"
+            f"  Status: {'✓ OK' if detalhe['sucesso'] else '✗ ERRO'}\n"
+            f"  Mensagem: {detalhe['mensagem']}\n"
+        )
+        
+        if detalhe.get('diferencas'):
+            parts.append("  Diferenças:\n")
+            parts.extend(f"    - {diff}\n" for diff in detalhe['diferencas'])
         
-        for detalhe in stats['detalhes']:
-            f.write(f"{detalhe['cnpj']} - {detalhe['razao_social']}\n")
-            f.write(f"  Status: {'✓ OK' if detalhe['sucesso'] else '✗ ERRO'}\n")
-            f.write(f"  Mensagem: {detalhe['mensagem']}\n")
-            
-            if detalhe.get('diferencas'):
-                f.write(f"  Diferenças:\n")
-                for diff in detalhe['diferencas']:
-                    f.write(f"    - {diff}\n")
-            
-            f.write("\n")
-    
-    logger.info(f"\n✓ Relatório salvo em: {arquivo}")
-
-
-def salvar_relatorio_sync(stats: dict):
+        parts.append("\n")
+    
+    _salvar_relatorio(arquivo, parts, stats['detalhes'], texto)
+
+
+def salvar_relatorio_sync(stats: SyncStats, texto: bool = True):
     """Salva relatório consolidado de sync"""
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    arquivo = ROOT_DIR / "reports" / f"sync_{timestamp}.txt"
+    agora = datetime.now()
+    timestamp = agora.strftime("%Y%m%d_%H%M%S")
+    arquivo = REPORTS_DIR / f"sync_{timestamp}.txt"
     
     stats_cadastro = stats['cadastro']
     stats_atualizacao = stats['atualizacao']
     stats_modulos = stats.get('modulos')
     
-    with open(arquivo, "w", encoding="utf-8") as f:
-        f.write("RELATÓRIO DE SYNC COMPLETO\n")
-        f.write("=" * 60 + "\n\n")
-        f.write(f"Data: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}\n\n")
-        
-        f.write("FASE 1: CADASTRO\n")
-        f.write("-" * 60 + "\n")
-        f.write(f"Total: {stats_cadastro['total']}\n")
-        f.write(f"✓ Cadastrados: {stats_cadastro['sucesso']}\n")
-        f.write(f"⚠ Já existiam: {stats_cadastro['ja_cadastrados']}\n")
-        f.write(f"✗ Erros: {stats_cadastro['erros']}\n\n")
-        
-        f.write("FASE 2: ATUALIZAÇÃO\n")
-        f.write("-" * 60 + "\n")
-        f.write(f"Total: {stats_atualizacao['total']}\n")
-        f.write(f"✓ Atualizados: {stats_atualizacao['atualizados']}\n")
-        f.write(f"= Sem alteração: {stats_atualizacao['sem_alteracao']}\n")
-        f.write(f"⚠ Não cadastrados: {stats_atualizacao['nao_cadastrados']}\n")
-        f.write(f"✗ Erros: {stats_atualizacao['erros']}\n\n")
-        
-        if stats_modulos:
-            f.write("FASE 3: CONFIGURAÇÃO DE MÓDULOS\n")
-            f.write("-" * 60 + "\n")
-            f.write(f"Total: {stats_modulos['total']}\n")
-            f.write(f"Módulo Federal:\n")
-            f.write(f"  ✓ Ativados: {stats_modulos['federal_ativado']}\n")
-            f.write(f"  ⚠ Desativados: {stats_modulos['federal_desativado']}\n")
-            f.write(f"Módulo Serviços:\n")
-            f.write(f"  ✓ Ativados: {stats_modulos['servicos_ativado']}\n")
-            f.write(f"  ⚠ Desativados: {stats_modulos['servicos_desativado']}\n")
-            f.write(f"✗ Erros: {stats_modulos['erros']}\n\n")
-        
-        f.write("=" * 60 + "\n")
-        f.write("RESUMO GERAL\n")
-        f.write("=" * 60 + "\n")
-        f.write(f"Empresas processadas: {stats_cadastro['total']}\n")
-        f.write(f"Novos cadastros: {stats_cadastro['sucesso']}\n")
-        f.write(f"Atualizações: {stats_atualizacao['atualizados']}\n")
-        f.write(f"Sem alteração: {stats_atualizacao['sem_alteracao']}\n")
-        
-        if stats_modulos:
-            f.write(f"Módulos Federal ativados: {stats_modulos['federal_ativado']}\n")
-            f.write(f"Módulos Serviços ativados: {stats_modulos['servicos_ativado']}\n")
-        
-        total_erros = stats_cadastro['erros'] + stats_atualizacao['erros']
-        if stats_modulos:
-            total_erros += stats_modulos['erros']
-        
-        f.write(f"Erros: {total_erros}\n")
+    parts = [
+        "RELATÓRIO DE SYNC COMPLETO\n",
+        "=" * 60 + "\n\n",
+        f"Data: {agora.strftime('%d/%m/%Y %H:%M:%S')}\n\n",
+        "FASE 1: CADASTRO\n" + "-" * 60 + "\n",
+        f"Total: {stats_cadastro['total']}\n"
+        f"✓ Cadastrados: {stats_cadastro['sucesso']}\n"
+        f"⚠ Já existiam: {stats_cadastro['ja_cadastrados']}\n"
+        f"✗ Erros: {stats_cadastro['erros']}\n\n",
+        "FASE 2: ATUALIZAÇÃO\n" + "-" * 60 + "\n",
+        f"Total: {stats_atualizacao['total']}\n"
+        f"✓ Atualizados: {stats_atualizacao['atualizados']}\n"
+        f"= Sem alteração: {stats_atualizacao['sem_alteracao']}\n"
+        f"⚠ Não cadastrados: {stats_atualizacao['nao_cadastrados']}\n"
+        f"✗ Erros: {stats_atualizacao['erros']}\n\n",
+    ]
+    
+    if stats_modulos:
+        parts.append(
+            "FASE 3: CONFIGURAÇÃO DE MÓDULOS\n" + "-" * 60 + "\n"
+            f"Total: {stats_modulos['total']}\n"
+            "Módulo Federal:\n"
+            f"  ✓ Ativados: {stats_modulos['federal_ativado']}\n"
+            f"  ⚠ Desativados: {stats_modulos['federal_desativado']}\n"
+            "Módulo Serviços:\n"
+            f"  ✓ Ativados: {stats_modulos['servicos_ativado']}\n"
+            f"  ⚠ Desativados: {stats_modulos['servicos_desativado']}\n"
+            f"✗ Erros: {stats_modulos['erros']}\n\n"
+        )
+    
+    parts.append(
+        "=" * 60 + "\nRESUMO GERAL\n" + "=" * 60 + "\n"
+        f"Empresas processadas: {stats_cadastro['total']}\n"
+        f"Novos cadastros: {stats_cadastro['sucesso']}\n"
+        f"Atualizações: {stats_atualizacao['atualizados']}\n"
+        f"Sem alteração: {stats_atualizacao['sem_alteracao']}\n"
+    )
+    
+    if stats_modulos:
+        parts.append(
+            f"Módulos Federal ativados: {stats_modulos['federal_ativado']}\n"
+            f"Módulos Serviços ativados: {stats_modulos['servicos_ativado']}\n"
+        )
     
-    logger.info(f"\n✓ Relatório salvo em: {arquivo}")
+    total_erros = stats_cadastro['erros'] + stats_atualizacao['erros']
+    if stats_modulos:
+        total_erros += stats_modulos['erros']
+    
+    parts.append(f"Erros: {total_erros}\n")
+    
+    _salvar_relatorio(arquivo, parts, _detalhes_sync(stats_cadastro, stats_atualizacao, stats_modulos), texto)
 
 
-def salvar_relatorio_modulos(stats: dict):
+def salvar_relatorio_modulos(stats: ModulosStats, texto: bool = True):
     """Salva relatório de configuração de módulos"""
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    arquivo = ROOT_DIR / "reports" / f"modulos_{timestamp}.txt"
-    
-    with open(arquivo, "w", encoding="utf-8") as f:
-        f.write("RELATÓRIO DE CONFIGURAÇÃO DE MÓDULOS\n")
-        f.write("=" * 60 + "\n\n")
-        f.write(f"Data: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}\n\n")
-        f.write(f"Total: {stats['total']}\n")
-        f.write(f"Módulo Federal:\n")
-        f.write(f"  ✓ Ativados: {stats['federal_ativado']}\n")
-        f.write(f"  ⚠ Desativados: {stats['federal_desativado']}\n")
-        f.write(f"Módulo Serviços:\n")
-        f.write(f"  ✓ Ativados: {stats['servicos_ativado']}\n")
-        f.write(f"  ⚠ Desativados: {stats['servicos_desativado']}\n")
-        f.write(f"✗ Erros: {stats['erros']}\n\n")
-        f.write("=" * 60 + "\n")
-        f.write("DETALHES\n")
-        f.write("=" * 60 + "\n\n")
-        
-        for detalhe in stats['detalhes']:
-            f.write(f"{detalhe['cnpj']} - {detalhe['razao_social']}\n")
-            f.write(f"  Módulo Federal: {detalhe['federal']}\n")
-            f.write(f"  Módulo Serviços: {detalhe['servicos']}\n")
-            f.write(f"  Status: {'✓ OK' if detalhe['sucesso'] else '✗ ERRO'}\n\n")
+    agora = datetime.now()
+    timestamp = agora.strftime("%Y%m%d_%H%M%S")
+    arquivo = REPORTS_DIR / f"modulos_{timestamp}.txt"
+    
+    parts = [
+        "RELATÓRIO DE CONFIGURAÇÃO DE MÓDULOS\n",
+        "=" * 60 + "\n\n",
+        f"Data: {agora.strftime('%d/%m/%Y %H:%M:%S')}\n\n",
+        f"Total: {stats['total']}\n"
+        "Módulo Federal:\n"
+        f"  ✓ Ativados: {stats['federal_ativado']}\n"
+        f"  ⚠ Desativados: {stats['federal_desativado']}\n"
+        "Módulo Serviços:\n"
+        f"  ✓ Ativados: {stats['servicos_ativado']}\n"
+        f"  ⚠ Desativados: {stats['servicos_desativado']}\n"
+        f"✗ Erros: {stats['erros']}\n\n",
+        "=" * 60 + "\nDETALHES\n" + "=" * 60 + "\n\n",
+    ]
+    
+    for detalhe in stats['detalhes']:
+        parts.append(
+            f"{detalhe['cnpj']} - {detalhe['razao_social']}\n"
+            f"  Módulo Federal: {detalhe['federal']}\n"
+            f"  Módulo Serviços: {detalhe['servicos']}\n"
+            f"  Status: {'✓ OK' if detalhe['sucesso'] else '✗ ERRO'}\n\n"
+        )
+    
+    _salvar_relatorio(arquivo, parts, stats['detalhes'], texto)
+
+
+# Modos de operação disponíveis na CLI (também definem as opções do argumento "modo")
+MODES = {
+    "cadastro": modo_cadastro,
+    "atualizacao": modo_atualizacao,
+    "sync": modo_sync,
+    "comparar": modo_comparar,
+    "modulos": modo_modulos,
+}
+
+
+def main(argv: Optional[List[str]] = None):
+    """
+    Função principal
     
-    logger.info(f"\n✓ Relatório salvo em: {arquivo}")
-
-
-def main():
-    """Função principal"""
+    Args:
+        argv: Argumentos da linha de comando (usa sys.argv se não fornecido)
+    """
     try:
         # Configurar argumentos
         parser = configurar_argumentos()
-        args = parser.parse_args()
+        args = parser.parse_args(argv)
         
         # Configurar logger
         configurar_logger(debug=args.debug)
@@ -494,17 +739,11 @@ def main():
         if args.dry_run:
             logger.warning("⚠ MODO DRY-RUN: Nenhuma alteração será feita\n")
         
+        # Cliente API único para o processo (sessão HTTP e token compartilhados entre as fases)
+        api = JettaxAPI()
+        
         # Executar modo selecionado
-        if args.modo == "cadastro":
-            modo_cadastro(args)
-        elif args.modo == "atualizacao":
-            modo_atualizacao(args)
-        elif args.modo == "sync":
-            modo_sync(args)
-        elif args.modo == "comparar":
-            modo_comparar(args)
-        elif args.modo == "modulos":
-            modo_modulos(args)
+        MODES[args.modo](args, api)
         
         logger.info("\n✓ Processamento concluído com sucesso!\n")
         
@@ -513,9 +752,8 @@ def main():
         sys.exit(1)
     
     except Exception as e:
-        logger.error(f"\n✗ Erro fatal: {e}")
-        import traceback
-        traceback.print_exc()
+        # Traceback pelo logger: vai para o console, o arquivo de log e o painel
+        logger.exception(f"\n✗ Erro fatal: {e}")
         sys.exit(1)
 
 
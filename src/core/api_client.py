@@ -1,18 +1,41 @@
 """
 Cliente da API JETTAX 360
 """
+import base64
 import os
+import threading
 import time
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, Iterator, List, Tuple
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import make_headers
+from urllib3.util.retry import Retry
 from pathlib import Path
 from dotenv import load_dotenv
 
 from ..utils.logger import get_logger
 from ..utils.cnpj_utils import somente_digitos, formatar_cnpj
+from ..utils.lote import executar_em_lote
 
 logger = get_logger()
 
+# Páginas de clientes buscadas simultaneamente em listar_todos_clientes (padrão)
+PAGINACAO_WORKERS = 8
+
+# Arquivo .env com as credenciais, lido uma única vez por processo
+ENV_FILE = Path(__file__).parent.parent.parent / "config" / ".env"
+_env_carregado = False
+
+# Respostas que justificam nova tentativa (com backoff) no adapter HTTP
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+# Token persistido entre execuções, para evitar um login a cada chamada da CLI
+TOKEN_CACHE_FILE = Path.home() / ".jettax" / "token.json"
+
+# Margem de segurança antes da expiração do token (em memória ou salvo)
+TOKEN_MARGEM_SEGUNDOS = 60
+
 
 class JettaxAPIError(Exception):
     """Erro específico da API JETTAX"""
@@ -29,7 +52,9 @@ class JettaxAPI:
         email: Optional[str] = None,
         password: Optional[str] = None,
         timeout: int = 30,
-        max_retries: int = 3
+        max_retries: int = 3,
+        paginacao_workers: int = PAGINACAO_WORKERS,
+        token_cache: Optional[Path] = TOKEN_CACHE_FILE
     ):
         """
         Inicializa cliente da API
@@ -41,9 +66,14 @@ class JettaxAPI:
             password: Senha do escritório (usa .env se não fornecido)
             timeout: Timeout para requisições em segundos
             max_retries: Número máximo de tentativas em caso de erro
+            paginacao_workers: Páginas de clientes buscadas simultaneamente
+            token_cache: Arquivo onde o token é persistido (None desativa)
         """
-        # Carregar variáveis de ambiente
-        load_dotenv(Path(__file__).parent.parent.parent / "config" / ".env")
+        # Carregar variáveis de ambiente (só na primeira instância)
+        global _env_carregado
+        if not _env_carregado:
+            load_dotenv(ENV_FILE)
+            _env_carregado = True
         
         self.api_url = (api_url or os.getenv("JETTAX_API_URL", "https://api.jettax360.com.br")).rstrip("/")
         self.auth_url = (auth_url or os.getenv("JETTAX_AUTH_URL", "https://api-auth.jettax360.com.br")).rstrip("/")
@@ -51,27 +81,163 @@ class JettaxAPI:
         self.password = password or os.getenv("JETTAX_PASSWORD")
         self.timeout = timeout
         self.max_retries = max_retries
+        self.paginacao_workers = paginacao_workers
+        self.token_cache = Path(token_cache) if token_cache else None
         
         # Session HTTP
         self.session = requests.Session()
         self.session.headers.update({
             "Accept": "application/json",
             "Content-Type": "application/json",
-            "User-Agent": "JettaxAutomation/1.0"
+            "User-Agent": "JettaxAutomation/1.0",
+            # Respostas comprimidas; o urllib3 só anuncia br/zstd se o decodificador estiver instalado
+            **make_headers(accept_encoding=True)
         })
         
+        # Retentativas feitas pelo urllib3: backoff exponencial com jitter, respeitando
+        # Retry-After, e só para métodos idempotentes (um POST repetido duplicaria o cadastro)
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=1.0,
+            backoff_jitter=0.5,
+            backoff_max=30,
+            status_forcelist=RETRY_STATUS,
+            allowed_methods=frozenset(["GET", "PUT", "DELETE"]),
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        
+        # Pool dimensionado para os lotes e a paginação concorrentes reutilizarem conexões
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=64, max_retries=retry)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        
         # Token de autenticação (será preenchido no login)
         self._token: Optional[str] = None
         self._token_expires_at: Optional[float] = None
+        # Incrementado a cada token novo: identifica com qual token uma requisição saiu
+        self._token_versao = 0
+        
+        # Serializa o login quando o cliente é usado por várias threads (processamento em lote)
+        self._auth_lock = threading.Lock()
+        
+        # Cache do catálogo de clientes (invalidado a cada criação/atualização)
+        self._clientes_cache: Optional[List[Dict[str, Any]]] = None
+        self._clientes_lock = threading.Lock()
+        # Índice CNPJ (apenas dígitos) -> cliente, derivado do catálogo em cache
+        self._clientes_indice: Optional[Dict[str, Dict[str, Any]]] = None
+        # ETag e conteúdo de cada página, para revalidar com If-None-Match
+        self._paginas_cache: Dict[int, Tuple[str, Dict[str, Any]]] = {}
+        
+        # Regimes tributários mudam raramente: lidos uma vez por sessão
+        self._regimes_cache: Optional[List[Dict[str, Any]]] = None
+        # Nome normalizado -> ObjectId, na ordem da API
+        self._regimes_index: Optional[Dict[str, str]] = None
+        
+        # Consultas à Receita já feitas nesta sessão (CNPJ -> dados), só as bem-sucedidas
+        self._receita_cache: Dict[str, Dict[str, Any]] = {}
+        
+        # Códigos IBGE por (CIDADE, UF): muitas empresas compartilham o município
+        self._ibge_cache: Dict[Tuple[str, str], Optional[int]] = {}
+    
+    def _token_valido(self) -> bool:
+        # Renova um pouco antes do exp, para o token não expirar no meio de uma requisição
+        return bool(
+            self._token
+            and self._token_expires_at
+            and time.time() < self._token_expires_at - TOKEN_MARGEM_SEGUNDOS
+        )
     
     def _ensure_auth(self) -> None:
         """Garante que há um token válido de autenticação"""
         # Se já tem token válido, não faz nada
-        if self._token and self._token_expires_at and time.time() < self._token_expires_at:
+        if self._token_valido():
+            return
+        
+        with self._auth_lock:
+            # Outra thread pode ter autenticado enquanto esta aguardava
+            if not self._token_valido() and not self._carregar_token_cache():
+                self._login()
+    
+    def _definir_token(self, token: str, expires_at: float) -> None:
+        self._token = token
+        self._token_expires_at = expires_at
+        self._token_versao += 1
+        self.session.headers["Authorization"] = f"Bearer {token}"
+    
+    @staticmethod
+    def _expiracao_token(token: str) -> float:
+        """
+        Lê a expiração (claim exp) do JWT; sem ela, assume 1 hora
+        
+        Args:
+            token: Token JWT
+        
+        Returns:
+            Timestamp de expiração
+        """
+        try:
+            payload = token.split(".")[1]
+            payload += "=" * (-len(payload) % 4)
+            exp = orjson.loads(base64.urlsafe_b64decode(payload)).get("exp")
+            if exp:
+                return float(exp)
+        except Exception:
+            pass
+        
+        return time.time() + 3600
+    
+    def _carregar_token_cache(self) -> bool:
+        """
+        Reaproveita o token salvo por uma execução anterior, se ainda válido
+        
+        Returns:
+            True se o token foi carregado
+        """
+        if not self.token_cache:
+            return False
+        
+        try:
+            data = orjson.loads(self.token_cache.read_bytes())
+        except (OSError, orjson.JSONDecodeError):
+            return False
+        
+        token = data.get("token")
+        expires_at = data.get("expires_at") or 0
+        
+        # Token de outra conta ou perto de expirar: ignorar
+        if not token or data.get("email") != self.email:
+            return False
+        if expires_at - TOKEN_MARGEM_SEGUNDOS <= time.time():
+            return False
+        
+        self._definir_token(token, expires_at)
+        logger.debug("Token de autenticação reaproveitado do cache")
+        return True
+    
+    def _salvar_token_cache(self) -> None:
+        """Persiste o token atual (arquivo legível apenas pelo usuário)"""
+        if not self.token_cache:
+            return
+        
+        data = {"email": self.email, "token": self._token, "expires_at": self._token_expires_at}
+        
+        try:
+            self.token_cache.parent.mkdir(parents=True, exist_ok=True)
+            fd = os.open(self.token_cache, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "wb") as f:
+                f.write(orjson.dumps(data))
+        except OSError as e:
+            logger.warning(f"Não foi possível salvar o token em {self.token_cache}: {e}")
+    
+    def _invalidar_token_cache(self) -> None:
+        if not self.token_cache:
             return
         
-        # Fazer login
-        self._login()
+        try:
+            self.token_cache.unlink(missing_ok=True)
+        except OSError as e:
+            logger.warning(f"Não foi possível remover o token em {self.token_cache}: {e}")
     
     def _login(self) -> None:
         """Realiza login na API JETTAX"""
@@ -101,17 +267,14 @@ class JettaxAPI:
             token = token.split(" ", 1)[1].strip()
         else:
             # Tentar extrair do corpo da resposta
-            data = resp.json()
+            data = self._json(resp)
             token = data.get("access_token")
         
         if not token:
             raise JettaxAPIError("Token não encontrado na resposta de login")
         
-        self._token = token
-        self.session.headers["Authorization"] = f"Bearer {token}"
-        
-        # Definir expiração (1 hora)
-        self._token_expires_at = time.time() + 3600
+        self._definir_token(token, self._expiracao_token(token))
+        self._salvar_token_cache()
         
         logger.info("✓ Autenticação realizada com sucesso")
     
@@ -121,22 +284,25 @@ class JettaxAPI:
         endpoint: str,
         params: Optional[Dict] = None,
         json_data: Optional[Dict] = None,
-        retry_count: int = 0
+        headers: Optional[Dict[str, str]] = None,
+        reautenticar: bool = True
     ) -> requests.Response:
         """
-        Faz requisição HTTP com retry automático
+        Faz requisição HTTP (as retentativas ficam a cargo do adapter da sessão)
         
         Args:
             method: Método HTTP (GET, POST, PUT, DELETE)
             endpoint: Endpoint da API (ex: /api/v1/clients)
             params: Parâmetros de query string
             json_data: Dados JSON para enviar no body
-            retry_count: Contador interno de tentativas
+            headers: Headers adicionais desta requisição
+            reautenticar: Se True, refaz o login uma vez em caso de 401/403
         
         Returns:
             Objeto Response
         """
         self._ensure_auth()
+        versao = self._token_versao
         
         url = f"{self.api_url}{endpoint}"
         
@@ -145,39 +311,46 @@ class JettaxAPI:
                 method=method,
                 url=url,
                 params=params,
-                json=json_data,
+                data=orjson.dumps(json_data) if json_data is not None else None,
+                headers=headers,
                 timeout=self.timeout
             )
             
             # Se 401/403, tentar reautenticar
-            if resp.status_code in (401, 403) and retry_count < self.max_retries:
+            if resp.status_code in (401, 403) and reautenticar:
                 logger.warning("Token expirado, reautenticando...")
-                self._token = None
-                self._login()
-                return self._request(method, endpoint, params, json_data, retry_count + 1)
+                with self._auth_lock:
+                    # Só a primeira thread com o token rejeitado refaz o login; as demais
+                    # aguardam o lock e reaproveitam o token novo
+                    if self._token_versao == versao:
+                        self._token = None
+                        self._invalidar_token_cache()
+                        self._login()
+                return self._request(method, endpoint, params, json_data, headers, reautenticar=False)
             
             resp.raise_for_status()
             return resp
             
         except requests.exceptions.RequestException as e:
-            if retry_count < self.max_retries:
-                logger.warning(f"Erro na requisição, tentando novamente ({retry_count + 1}/{self.max_retries})...")
-                time.sleep(2 ** retry_count)  # Backoff exponencial
-                return self._request(method, endpoint, params, json_data, retry_count + 1)
-            
             raise JettaxAPIError(f"Erro na requisição: {e}")
     
+    @staticmethod
+    def _json(resp: requests.Response) -> Any:
+        """Decodifica o corpo JSON da resposta com orjson (bem mais rápido que o json padrão)"""
+        return orjson.loads(resp.content)
+    
     # ============================================================================
     # CLIENTES
     # ============================================================================
     
-    def listar_clientes(self, limit: int = 50, page: int = 1) -> Dict[str, Any]:
+    def listar_clientes(self, limit: int = 50, page: int = 1, document: str = "") -> Dict[str, Any]:
         """
         Lista clientes do escritório (paginado)
         
         Args:
             limit: Número de resultados por página
             page: Número da página
+            document: Filtro por CNPJ/CPF (apenas dígitos), aplicado pelo servidor
         
         Returns:
             Dict com 'data' (lista de clientes) e 'meta' (paginação)
@@ -187,7 +360,7 @@ class JettaxAPI:
             "limit": limit,
             "status": "",  # Todas (ativas e inativas)
             "name": "",
-            "document": "",
+            "document": document,
             "city": "",
             "municipalRegistration": "",
             "excel": "",
@@ -198,46 +371,164 @@ class JettaxAPI:
             "taxation": ""
         }
         
-        resp = self._request("GET", "/api/v1/clients", params=params)
-        return resp.json()
+        # Revalida a página com o ETag da última resposta; 304 reaproveita o conteúdo
+        paginacao_padrao = limit == 50 and not document
+        cache = self._paginas_cache.get(page) if paginacao_padrao else None
+        headers = {"If-None-Match": cache[0]} if cache else None
+        
+        resp = self._request("GET", "/api/v1/clients", params=params, headers=headers)
+        if resp.status_code == 304 and cache:
+            return cache[1]
+        
+        result = self._json(resp)
+        etag = resp.headers.get("ETag")
+        if etag and paginacao_padrao:
+            self._paginas_cache[page] = (etag, result)
+        return result
     
     def listar_todos_clientes(self) -> List[Dict[str, Any]]:
         """
         Lista TODOS os clientes (faz paginação automática)
         
+        O resultado fica em cache até a próxima criação/atualização de cliente,
+        então as fases de um mesmo processamento compartilham um único download.
+        Só um catálogo completo entra no cache.
+        
         Returns:
             Lista completa de clientes
+        
+        Raises:
+            JettaxAPIError: Se alguma página falhou (o cache continua vazio)
         """
-        logger.info("Carregando todos os clientes do JETTAX...")
+        with self._clientes_lock:
+            clientes = self._clientes_cache
+            if clientes is None:
+                clientes = self._carregar_todos_clientes()
+                self._clientes_cache = clientes
+            return clientes
+    
+    def indice_clientes(self, force: bool = False) -> Dict[str, Dict[str, Any]]:
+        """
+        Índice dos clientes por CNPJ, montado uma vez a partir do catálogo em cache
         
-        all_clients = []
-        page = 1
+        Args:
+            force: Se True, baixa o catálogo novamente
         
-        while True:
-            try:
-                result = self.listar_clientes(limit=50, page=page)
+        Returns:
+            Dict CNPJ (apenas dígitos) -> dados do cliente
+        
+        Raises:
+            JettaxAPIError: Se alguma página falhou (catálogo e índice continuam vazios)
+        """
+        if force:
+            self.invalidar_cache_clientes()
+        
+        # Leitura e escrita dos caches sempre sob o lock, a partir de variáveis locais:
+        # uma invalidação vinda de outra thread não pode zerar o catálogo no meio da montagem
+        with self._clientes_lock:
+            indice = self._clientes_indice
+            if indice is None:
+                clientes = self._clientes_cache
+                if clientes is None:
+                    clientes = self._carregar_todos_clientes()
+                    self._clientes_cache = clientes
+                indice = self._indexar_clientes(clientes)
+                self._clientes_indice = indice
+            return indice
+    
+    def _indice_em_cache(self) -> Optional[Dict[str, Dict[str, Any]]]:
+        """Índice a partir do catálogo já em cache, sem baixar nada; None se não houver catálogo"""
+        with self._clientes_lock:
+            indice = self._clientes_indice
+            if indice is None and self._clientes_cache is not None:
+                indice = self._indexar_clientes(self._clientes_cache)
+                self._clientes_indice = indice
+            return indice
+    
+    @staticmethod
+    def _indexar_clientes(clientes: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        return {somente_digitos(str(cliente.get("document", ""))): cliente for cliente in clientes}
+    
+    def invalidar_cache_clientes(self) -> None:
+        """Descarta o catálogo em cache (as páginas continuam revalidáveis por ETag)"""
+        # Sob o lock: espera uma montagem em andamento terminar e descarta o resultado,
+        # que pode não ter o cliente que acabou de ser criado
+        with self._clientes_lock:
+            self._clientes_cache = None
+            self._clientes_indice = None
+    
+    def _carregar_pagina_clientes(self, page: int) -> Optional[Dict[str, Any]]:
+        """Carrega uma página de clientes; em caso de erro registra no log e devolve None"""
+        try:
+            return self.listar_clientes(limit=50, page=page)
+        except Exception as e:
+            logger.error(f"Erro ao carregar página {page}: {e}")
+            return None
+    
+    def iter_clientes(self) -> Iterator[Dict[str, Any]]:
+        """
+        Percorre os clientes à medida que as páginas chegam, na ordem das páginas
+        
+        A primeira página informa o total; as demais são buscadas em paralelo.
+        Interromper a iteração cancela as páginas que ainda não começaram.
+        
+        Yields:
+            Dados de cada cliente
+        
+        Raises:
+            JettaxAPIError: Se alguma página falhou (depois de percorrer as demais),
+                para que o catálogo incompleto nunca passe por completo
+        """
+        clientes = self._clientes_cache
+        if clientes is not None:
+            yield from clientes
+            return
+        
+        result = self._carregar_pagina_clientes(1)
+        if result is None:
+            raise JettaxAPIError("Falha ao carregar a página 1 de clientes")
+        clients = result.get("data", [])
+        
+        # Verificar se há mais páginas
+        meta = result.get("meta", {})
+        pagination = meta.get("pagination", {})
+        total_pages = pagination.get("total_pages", 1)
+        
+        logger.debug(f"Página 1/{total_pages} carregada ({len(clients)} empresas)")
+        yield from clients
+        
+        if clients and total_pages > 1:
+            paginas = range(2, total_pages + 1)
+            resultados = executar_em_lote(self._carregar_pagina_clientes, paginas, self.paginacao_workers)
+            
+            falhas = []
+            for page, result in zip(paginas, resultados):
+                if result is None:
+                    falhas.append(page)
+                    continue
                 clients = result.get("data", [])
-                
-                if not clients:
-                    break
-                
-                all_clients.extend(clients)
-                
-                # Verificar se há mais páginas
-                meta = result.get("meta", {})
-                pagination = meta.get("pagination", {})
-                total_pages = pagination.get("total_pages", 1)
-                
                 logger.debug(f"Página {page}/{total_pages} carregada ({len(clients)} empresas)")
-                
-                if page >= total_pages:
-                    break
-                
-                page += 1
-                
-            except Exception as e:
-                logger.error(f"Erro ao carregar página {page}: {e}")
-                break
+                yield from clients
+            
+            if falhas:
+                raise JettaxAPIError(
+                    f"Falha ao carregar {len(falhas)} página(s) de clientes: {', '.join(map(str, falhas))}"
+                )
+    
+    def _carregar_todos_clientes(self) -> List[Dict[str, Any]]:
+        """
+        Percorre todas as páginas de clientes
+        
+        Um catálogo parcial não é devolvido: em cache, ele faria cada CNPJ das páginas
+        que faltaram parecer não cadastrado (cadastros duplicados, atualizações puladas)
+        """
+        logger.info("Carregando todos os clientes do JETTAX...")
+        
+        try:
+            all_clients = list(self.iter_clientes())
+        except JettaxAPIError as e:
+            logger.error(f"✗ Catálogo de clientes incompleto, nada foi guardado em cache: {e}")
+            raise
         
         logger.info(f"✓ {len(all_clients)} clientes carregados")
         return all_clients
@@ -254,9 +545,30 @@ class JettaxAPI:
         """
         cnpj_digitos = somente_digitos(cnpj)
         
-        # Buscar em todas as empresas
-        clientes = self.listar_todos_clientes()
+        # Com o catálogo já em cache a busca é local; senão o servidor filtra pelo documento
+        indice = self._indice_em_cache()
+        if indice is not None:
+            return indice.get(cnpj_digitos)
+        
+        clientes = self.listar_clientes(limit=5, page=1, document=cnpj_digitos).get("data", [])
+        
+        # Nenhum resultado: o filtro funcionou e o CNPJ não existe
+        if not clientes:
+            return None
+        
+        cliente = self._cliente_com_documento(clientes, cnpj_digitos)
         
+        # Resultados sem o CNPJ exato indicam que o filtro não foi aplicado: usa o catálogo
+        if cliente is None:
+            cliente = self.indice_clientes().get(cnpj_digitos)
+        
+        return cliente
+    
+    @staticmethod
+    def _cliente_com_documento(
+        clientes: List[Dict[str, Any]],
+        cnpj_digitos: str
+    ) -> Optional[Dict[str, Any]]:
         for cliente in clientes:
             doc = somente_digitos(str(cliente.get("document", "")))
             if doc == cnpj_digitos:
@@ -264,6 +576,25 @@ class JettaxAPI:
         
         return None
     
+    def buscar_clientes_por_cnpjs(
+        self,
+        cnpjs: List[str],
+        max_workers: int = 8
+    ) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        Busca vários clientes por CNPJ, com as consultas em paralelo
+        
+        Args:
+            cnpjs: CNPJs com ou sem máscara
+            max_workers: Consultas simultâneas
+        
+        Returns:
+            Dict CNPJ (apenas dígitos) -> dados do cliente ou None
+        """
+        chaves = list(dict.fromkeys(somente_digitos(cnpj) for cnpj in cnpjs))
+        resultados = executar_em_lote(self.buscar_cliente_por_cnpj, chaves, max_workers)
+        return dict(zip(chaves, resultados))
+    
     def obter_cliente(self, client_id: str) -> Dict[str, Any]:
         """
         Obtém dados completos de um cliente por ID
@@ -278,7 +609,7 @@ class JettaxAPI:
             Dados completos do cliente (objeto com 59 campos)
         """
         resp = self._request("GET", f"/api/v1/clients/{client_id}")
-        result = resp.json()
+        result = self._json(resp)
         
         # API retorna {data: {...}} - extrair o objeto data
         if isinstance(result, dict) and "data" in result:
@@ -299,7 +630,8 @@ class JettaxAPI:
         logger.info(f"Criando cliente {payload.get('document')} - {payload.get('name')}")
         
         resp = self._request("POST", "/api/v1/clients", json_data=payload)
-        result = resp.json()
+        result = self._json(resp)
+        self.invalidar_cache_clientes()
         
         logger.info(f"✓ Cliente criado com sucesso (ID: {result.get('id', 'N/A')})")
         return result
@@ -318,11 +650,39 @@ class JettaxAPI:
         logger.info(f"Atualizando cliente {client_id}")
         
         resp = self._request("PUT", f"/api/v1/clients/{client_id}", json_data=payload)
-        result = resp.json()
+        result = self._json(resp)
+        self.invalidar_cache_clientes()
         
         logger.info(f"✓ Cliente atualizado com sucesso")
         return result
     
+    def atualizar_clientes_em_lote(
+        self,
+        itens: List[Tuple[str, Dict[str, Any]]],
+        max_workers: int = 4
+    ) -> List[Tuple[str, Optional[Dict[str, Any]], Optional[Exception]]]:
+        """
+        Atualiza vários clientes, com as requisições em paralelo
+        
+        Uma falha não interrompe o lote: cada item traz seu resultado ou seu erro.
+        
+        Args:
+            itens: Lista de tuplas (client_id, payload)
+            max_workers: Atualizações simultâneas
+        
+        Returns:
+            Lista de tuplas (client_id, resposta ou None, erro ou None), na ordem dos itens
+        """
+        def atualizar(item: Tuple[str, Dict[str, Any]]):
+            client_id, payload = item
+            try:
+                return client_id, self.atualizar_cliente(client_id, payload), None
+            except Exception as e:
+                logger.error(f"✗ Erro ao atualizar cliente {client_id}: {e}")
+                return client_id, None, e
+        
+        return list(executar_em_lote(atualizar, itens, max_workers))
+    
     # ============================================================================
     # UTILITÁRIOS
     # ============================================================================
@@ -337,22 +697,46 @@ class JettaxAPI:
         Returns:
             Dados do CNPJ ou None se não encontrado
         """
+        if cnpj in self._receita_cache:
+            return self._receita_cache[cnpj]
+        
         logger.debug(f"Consultando CNPJ {formatar_cnpj(cnpj)} na Receita Federal...")
         
         try:
             resp = self._request("GET", f"/api/v1/utils/search-document/{cnpj}")
-            data = resp.json()
+            data = self._json(resp)
             
             # Normalizar resposta
             if isinstance(data, dict) and "item" in data:
-                return data["item"]
+                data = data["item"]
             
+            if data:
+                self._receita_cache[cnpj] = data
             return data
             
         except Exception as e:
             logger.warning(f"Erro ao consultar CNPJ {formatar_cnpj(cnpj)}: {e}")
             return None
     
+    def consultar_cnpjs_receita(
+        self,
+        cnpjs: List[str],
+        max_workers: int = 8
+    ) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        Consulta vários CNPJs na Receita Federal, em paralelo
+        
+        Args:
+            cnpjs: CNPJs apenas com dígitos (repetidos são consultados uma vez)
+            max_workers: Consultas simultâneas
+        
+        Returns:
+            Dict CNPJ -> dados do CNPJ ou None se não encontrado
+        """
+        chaves = list(dict.fromkeys(cnpjs))
+        resultados = executar_em_lote(self.consultar_cnpj_receita, chaves, max_workers)
+        return dict(zip(chaves, resultados))
+    
     def buscar_codigo_ibge(self, cidade: str, uf: str) -> Optional[int]:
         """
         Busca código IBGE de uma cidade
@@ -364,18 +748,25 @@ class JettaxAPI:
         Returns:
             Código IBGE ou None se não encontrado
         """
+        chave = (cidade.strip().upper(), uf.strip().upper())
+        if chave in self._ibge_cache:
+            return self._ibge_cache[chave]
+        
         try:
             params = {"name": cidade, "state": uf}
             resp = self._request("GET", "/api/v1/ibge/cities", params=params)
             
-            cidades = resp.json()
+            cidades = self._json(resp)
             
+            codigo = None
             if isinstance(cidades, list) and len(cidades) > 0:
                 first = cidades[0]
                 code = first.get("ibgeCode") or first.get("code")
-                return int(code) if code else None
+                codigo = int(code) if code else None
             
-            return None
+            # Só respostas da API são cacheadas (inclusive "não encontrado"); erros não
+            self._ibge_cache[chave] = codigo
+            return codigo
             
         except Exception as e:
             logger.warning(f"Erro ao buscar código IBGE para {cidade}/{uf}: {e}")
@@ -388,9 +779,14 @@ class JettaxAPI:
         Returns:
             Lista de regimes com id e nome
         """
+        if self._regimes_cache is not None:
+            return self._regimes_cache
+        
         try:
             resp = self._request("GET", "/api/v1/tax-regimes")
-            return resp.json()
+            # Falhas não são cacheadas: a próxima chamada tenta de novo
+            self._regimes_cache = self._json(resp)
+            return self._regimes_cache
         except Exception as e:
             logger.error(f"Erro ao listar regimes tributários: {e}")
             return []
@@ -405,19 +801,27 @@ class JettaxAPI:
         Returns:
             ObjectId do regime ou None se não encontrado
         """
-        regimes = self.listar_regimes_tributarios()
+        if self._regimes_index is None:
+            regimes = self.listar_regimes_tributarios()
+            if not regimes:
+                return None
+            
+            index: Dict[str, str] = {}
+            for regime in regimes:
+                regime_nome = str(regime.get("name") or regime.get("description") or "").lower().strip()
+                index.setdefault(regime_nome, regime.get("id") or regime.get("_id"))
+            self._regimes_index = index
         
         nome_normalizado = nome.lower().strip()
         
-        for regime in regimes:
-            regime_nome = str(regime.get("name") or regime.get("description") or "").lower().strip()
-            
-            # Busca exata
-            if regime_nome == nome_normalizado:
-                return regime.get("id") or regime.get("_id")
-            
-            # Busca parcial
+        # Busca exata
+        regime_id = self._regimes_index.get(nome_normalizado)
+        if regime_id:
+            return regime_id
+        
+        # Busca parcial
+        for regime_nome, regime_id in self._regimes_index.items():
             if nome_normalizado in regime_nome or regime_nome in nome_normalizado:
-                return regime.get("id") or regime.get("_id")
+                return regime_id
         
         return None
@@ -2,18 +2,81 @@
 Leitor da planilha RELAÇÃO DE EMPRESAS.xlsx
 """
 import pandas as pd
+from pydantic import TypeAdapter, ValidationError
 from pathlib import Path
-from typing import List, Optional
+from typing import BinaryIO, List, Optional, Union
 from datetime import datetime
 
 from ..models.empresa import Empresa
 from ..utils.logger import get_logger
-from ..utils.cnpj_utils import normalizar_cnpj, normalizar_cpf
+from ..utils.cnpj_utils import normalizar_cpf
 from ..utils.date_utils import parse_date
 
 logger = get_logger()
 
 
+# Engines aceitos pelo pandas para leitura da planilha
+ENGINES = ("calamine", "openpyxl")
+
+
+# Colunas da planilha -> campos de Empresa
+COLUNAS_TEXTO = {
+    "Razao Social": "razao_social",
+    "Tributacao": "tributacao",
+    "Municipio": "municipio",
+    "IE": "ie",
+    "IM": "im",
+    "NIRE": "nire",
+    "Ramo atividade": "ramo_atividade",
+    "Responsável": "responsavel",
+    "e-mail": "email",
+    "Senha": "senha_prefeitura"
+}
+COLUNAS_DATA = {
+    "Data de Cadastro": "data_cadastro",
+    "Cadastro JETTAX": "cadastro_jettax"
+}
+CAMPOS_OBRIGATORIOS = ("cnpj", "razao_social", "tributacao", "municipio")
+
+# Colunas opcionais contadas em obter_estatisticas -> chave do resultado
+COLUNAS_ESTATISTICAS = {
+    "IE": "com_ie",
+    "IM": "com_im",
+    "NIRE": "com_nire",
+    "e-mail": "com_email",
+    "Data de Cadastro": "com_data_cadastro",
+    "Cadastro JETTAX": "com_cadastro_jettax"
+}
+
+# Valida a lista inteira numa única chamada ao pydantic-core
+_EMPRESAS = TypeAdapter(List[Empresa])
+
+
+def _texto(serie: pd.Series, vazio: Optional[str] = None) -> pd.Series:
+    """Converte a coluna para texto sem espaços nas pontas; células vazias viram `vazio`"""
+    texto = serie.astype("string").str.strip().astype(object)
+    return texto.where(serie.notna(), vazio)
+
+
+def normalizar_coluna_cnpj(serie: pd.Series) -> pd.Series:
+    """
+    Normaliza a coluna de CNPJ inteira numa passada: só dígitos, com os zeros à esquerda
+    que o Excel perde em células numéricas; células vazias viram ""
+    """
+    digitos = serie.astype("string").str.replace(r"\D", "", regex=True).fillna("")
+    return digitos.where(digitos == "", digitos.str.zfill(14)).astype(object)
+
+
+def formatar_coluna_cnpj(serie: pd.Series) -> pd.Series:
+    """
+    Formata a coluna de CNPJs (só dígitos) no padrão 00.000.000/0000-00 numa passada;
+    valores que não têm 14 dígitos ficam como estão, como em formatar_cnpj
+    """
+    return serie.str.replace(
+        r"^(\d{2})(\d{3})(\d{3})(\d{4})(\d{2})$", r"\1.\2.\3/\4-\5", regex=True
+    )
+
+
 class ExcelReaderError(Exception):
     """Erro ao ler planilha Excel"""
     pass
@@ -22,17 +85,31 @@ class ExcelReaderError(Exception):
 class ExcelReader:
     """Leitor da planilha de empresas"""
     
-    def __init__(self, file_path: str):
+    def __init__(self, file_path: Union[str, Path, BinaryIO], engine: str = "calamine"):
         """
         Inicializa leitor
         
         Args:
-            file_path: Caminho completo da planilha
+            file_path: Caminho completo da planilha ou arquivo binário já aberto
+                (ex.: upload mantido em memória)
+            engine: Engine de leitura ("calamine", bem mais rápido, ou "openpyxl")
         """
-        self.file_path = Path(file_path)
+        if engine not in ENGINES:
+            raise ExcelReaderError(f"Engine inválido: {engine} (use {', '.join(ENGINES)})")
+        self.engine = engine
         
-        if not self.file_path.exists():
-            raise ExcelReaderError(f"Planilha não encontrada: {file_path}")
+        # Stream: lido direto pelo pandas, sem passar pelo disco
+        if hasattr(file_path, "read"):
+            self.file_path: Optional[Path] = None
+            self._origem = file_path
+            self.nome = getattr(file_path, "name", None) or "(upload)"
+        else:
+            self.file_path = Path(file_path)
+            self._origem = self.file_path
+            self.nome = self.file_path.name
+            
+            if not self.file_path.exists():
+                raise ExcelReaderError(f"Planilha não encontrada: {file_path}")
         
         self._df: Optional[pd.DataFrame] = None
     
@@ -43,16 +120,24 @@ class ExcelReader:
         Returns:
             DataFrame com os dados
         """
-        logger.info(f"Carregando planilha: {self.file_path.name}")
+        logger.info(f"Carregando planilha: {self.nome}")
+        
+        # Stream já lido antes: volta ao início
+        if self.file_path is None:
+            self._origem.seek(0)
         
         try:
-            # Ler Excel
-            df = pd.read_excel(self.file_path, header=0)
+            # Mesma leitura nos dois engines. Com header=0 a linha vazia do topo vira
+            # o cabeçalho ("Unnamed: N") e as colunas ficam com tipo misto (objeto), então
+            # CPF e Senha mantêm os zeros à esquerda; lendo o cabeçalho real direto
+            # (header=1) o pandas inferiria essas colunas como números
+            df = pd.read_excel(self._origem, header=0, engine=self.engine)
             
-            # A primeira linha contém os nomes das colunas
-            df.columns = df.iloc[0]
-            df = df[1:]  # Remover linha de cabeçalho duplicada
-            df.reset_index(drop=True, inplace=True)
+            # Cabeçalho real na primeira linha de dados: promovê-lo
+            if "CNPJ" not in df.columns:
+                df.columns = df.iloc[0]
+                df = df[1:]  # Remover linha de cabeçalho duplicada
+                df.reset_index(drop=True, inplace=True)
             
             self._df = df
             
@@ -113,104 +198,31 @@ class ExcelReader:
         
         logger.info("Convertendo dados para objetos Empresa...")
         
-        empresas = []
-        erros = 0
-        
-        for idx, row in self._df.iterrows():
-            try:
-                # Extrair dados da linha
-                cnpj = normalizar_cnpj(row.get("CNPJ"))
-                razao_social = str(row.get("Razao Social", "")).strip()
-                tributacao = str(row.get("Tributacao", "")).strip()
-                municipio = str(row.get("Municipio", "")).strip()
-                
-                # Validar campos obrigatórios
-                if not cnpj or not razao_social or not tributacao or not municipio:
-                    logger.warning(
-                        f"Linha {idx + 2}: Campos obrigatórios faltando "
-                        f"(CNPJ={cnpj}, Razão={razao_social[:20]})"
-                    )
+        dados = self._preparar_dados()
+        
+        # Validar campos obrigatórios (uma máscara para todas as linhas)
+        validos = dados[list(CAMPOS_OBRIGATORIOS)].astype(bool).all(axis=1)
+        erros = int((~validos).sum())
+        
+        for idx, linha in dados[~validos].iterrows():
+            logger.warning(
+                f"Linha {idx + 2}: Campos obrigatórios faltando "
+                f"(CNPJ={linha['cnpj']}, Razão={linha['razao_social'][:20]})"
+            )
+        
+        registros = dados[validos].to_dict("records")
+        
+        try:
+            empresas = _EMPRESAS.validate_python(registros)
+        except ValidationError:
+            # Alguma linha inválida: validar uma a uma para descartar só as que falharam
+            empresas = []
+            for idx, registro in zip(dados.index[validos], registros):
+                try:
+                    empresas.append(Empresa(**registro))
+                except Exception as e:
+                    logger.error(f"Erro ao processar linha {idx + 2}: {e}")
                     erros += 1
-                    continue
-                
-                # Campos opcionais
-                ie = row.get("IE")
-                if pd.notna(ie):
-                    ie = str(ie).strip()
-                else:
-                    ie = None
-                
-                im = row.get("IM")
-                if pd.notna(im):
-                    im = str(im).strip()
-                else:
-                    im = None
-                
-                nire = row.get("NIRE")
-                if pd.notna(nire):
-                    nire = str(nire).strip()
-                else:
-                    nire = None
-                
-                ramo_atividade = row.get("Ramo atividade")
-                if pd.notna(ramo_atividade):
-                    ramo_atividade = str(ramo_atividade).strip()
-                else:
-                    ramo_atividade = None
-                
-                responsavel = row.get("Responsável")
-                if pd.notna(responsavel):
-                    responsavel = str(responsavel).strip()
-                else:
-                    responsavel = None
-                
-                email = row.get("e-mail")
-                if pd.notna(email):
-                    email = str(email).strip()
-                else:
-                    email = None
-                
-                # Datas
-                data_cadastro = parse_date(row.get("Data de Cadastro"))
-                cadastro_jettax = parse_date(row.get("Cadastro JETTAX"))
-                
-                # Credenciais prefeitura
-                cpf = row.get("CPF")
-                if pd.notna(cpf):
-                    cpf = normalizar_cpf(cpf)
-                else:
-                    cpf = None
-                
-                senha = row.get("Senha")
-                if pd.notna(senha):
-                    senha = str(senha).strip()
-                else:
-                    senha = None
-                
-                # Criar objeto Empresa
-                empresa = Empresa(
-                    cnpj=cnpj,
-                    razao_social=razao_social,
-                    tributacao=tributacao,
-                    municipio=municipio,
-                    ie=ie,
-                    im=im,
-                    nire=nire,
-                    ramo_atividade=ramo_atividade,
-                    responsavel=responsavel,
-                    email=email,
-                    data_cadastro=data_cadastro,
-                    cpf_prefeitura=cpf,
-                    senha_prefeitura=senha,
-                    cadastro_jettax=cadastro_jettax
-                )
-                
-                empresas.append(empresa)
-                
-            except Exception as e:
-                logger.error(f"Erro ao processar linha {idx + 2}: {e}")
-                erros += 1
-                continue
         
         logger.info(f"✓ {len(empresas)} empresas convertidas com sucesso")
         
@@ -219,6 +231,30 @@ class ExcelReader:
         
         return empresas
     
+    def _preparar_dados(self) -> pd.DataFrame:
+        """
+        Normaliza as colunas da planilha de uma vez, já com os nomes dos campos de Empresa
+        
+        Returns:
+            DataFrame com uma coluna por campo (ausentes como None)
+        """
+        df = self._df
+        dados = pd.DataFrame(index=df.index)
+        
+        dados["cnpj"] = normalizar_coluna_cnpj(df["CNPJ"])
+        
+        for coluna, campo in COLUNAS_TEXTO.items():
+            vazio = "" if campo in CAMPOS_OBRIGATORIOS else None
+            dados[campo] = _texto(df[coluna], vazio)
+        
+        cpf = df["CPF"]
+        dados["cpf_prefeitura"] = cpf.map(normalizar_cpf).where(cpf.notna(), None)
+        
+        for coluna, campo in COLUNAS_DATA.items():
+            dados[campo] = df[coluna].map(parse_date).where(df[coluna].notna(), None)
+        
+        return dados
+    
     def obter_estatisticas(self) -> dict:
         """
         Retorna estatísticas da planilha
@@ -229,16 +265,18 @@ class ExcelReader:
         if self._df is None:
             self.carregar()
         
-        stats = {
-            "total_empresas": len(self._df),
-            "com_ie": self._df["IE"].notna().sum(),
-            "com_im": self._df["IM"].notna().sum(),
-            "com_nire": self._df["NIRE"].notna().sum(),
-            "com_email": self._df["e-mail"].notna().sum(),
-            "com_data_cadastro": self._df["Data de Cadastro"].notna().sum(),
-            "com_cadastro_jettax": self._df["Cadastro JETTAX"].notna().sum(),
-            "regimes_unicos": self._df["Tributacao"].nunique(),
-            "regimes": self._df["Tributacao"].value_counts().to_dict()
-        }
+        # Contagem de preenchidos de todas as colunas numa única passada
+        preenchidos = self._df[list(COLUNAS_ESTATISTICAS)].notna().sum()
+        
+        # value_counts já traz os regimes distintos: nunique seria outra passada
+        regimes = self._df["Tributacao"].value_counts().to_dict()
+        
+        stats = {"total_empresas": len(self._df)}
+        stats.update(
+            (chave, int(preenchidos[coluna]))
+            for coluna, chave in COLUNAS_ESTATISTICAS.items()
+        )
+        stats["regimes_unicos"] = len(regimes)
+        stats["regimes"] = regimes
         
         return stats
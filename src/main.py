@@ -1,34 +1,13 @@
 import sys
-import pandas as pd
 from services.atualizacao_service import AtualizacaoService
-from models.empresa import Empresa
 from core.api_client import JettaxAPI
+from core.excel_reader import ExcelReader
 
 PLANILHA_PATH = r"G:\- CONTABILIDADE -\Automação\JETTAX\RELAÇÃO DE EMPRESAS.xlsx"
 
-def linha_para_empresa(row):
-    return Empresa(
-        cnpj=row["CNPJ"],
-        razao_social=row["Razao Social"],
-        regime=row.get("Regime", ""),
-        tributacao=row.get("Tributacao", ""),
-        inscricao_estadual=row.get("IE", ""),
-        inscricao_municipal=row.get("IM", ""),
-        nire=row.get("NIRE", ""),
-        ramo_atividade=row.get("Ramo atividade", ""),
-        responsavel=row.get("Responsável", ""),
-        email=row.get("e-mail", ""),
-        municipio=row.get("Municipio", ""),
-        data_cadastro=row.get("Data de Cadastro", ""),
-        cpf=row.get("CPF", ""),
-        senha=row.get("Senha", ""),
-        cadastro_jettax=row.get("Cadastro JETTAX", "")
-    )
-
 def automacao_atualizacao():
     print("Iniciando automação de atualização cadastral...")
-    df = pd.read_excel(PLANILHA_PATH, dtype=str)
-    empresas = [linha_para_empresa(row) for _, row in df.iterrows()]
+    empresas = ExcelReader(PLANILHA_PATH).converter_para_empresas()
     api_client = JettaxAPI()  # Configure conforme necessário
     service = AtualizacaoService(api_client, dry_run=True)  # dry_run=True para teste
     resultado = service.atualizar_em_lote(empresas)
@@ -6,6 +6,13 @@ from typing import Optional, List
 from datetime import date
 import re
 
+from ..utils.cnpj_utils import somente_digitos
+
+
+# Padrões compilados uma única vez (usados a cada Empresa construída)
+_EMAIL = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+_SERVICOS = re.compile(r'servi[çc]o')
+
 
 class Empresa(BaseModel):
     """Modelo de dados de uma empresa"""
@@ -68,7 +75,7 @@ class Empresa(BaseModel):
             raise ValueError('CNPJ é obrigatório')
         
         # Remover máscara se houver
-        digitos = re.sub(r'\D', '', v)
+        digitos = somente_digitos(v)
         
         if len(digitos) != 14:
             raise ValueError(f'CNPJ deve ter 14 dígitos, recebeu {len(digitos)}')
@@ -91,8 +98,7 @@ class Empresa(BaseModel):
         v = str(v).strip()
         
         # Regex básico para e-mail
-        pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-        if not re.match(pattern, v):
+        if not _EMAIL.match(v):
             # Apenas warning, não bloqueia
             return v
         
@@ -106,10 +112,7 @@ class Empresa(BaseModel):
         if not self.tributacao:
             return False
         
-        keywords = ['serviço', 'servico']
-        tributacao_lower = self.tributacao.lower()
-        
-        return any(kw in tributacao_lower for kw in keywords)
+        return _SERVICOS.search(self.tributacao.lower()) is not None
     
     def tem_credenciais_completas(self) -> bool:
         """Verifica se tem CPF e Senha preenchidos"""
@@ -122,7 +125,7 @@ class Empresa(BaseModel):
         
         try:
             # Tentar extrair apenas dígitos
-            digitos = re.sub(r'\D', '', self.ie)
+            digitos = somente_digitos(self.ie)
             return int(digitos) if digitos else 0
         except (ValueError, TypeError):
             return 0
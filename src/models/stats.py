@@ -0,0 +1,67 @@
+"""
+Modelos de dados: estatísticas do processamento em lote
+"""
+from typing import List, Optional, TypedDict
+
+
+class DetalheCadastro(TypedDict):
+    """Resultado do cadastro de uma empresa"""
+    cnpj: str
+    razao_social: str
+    sucesso: bool
+    mensagem: str
+
+
+class DetalheAtualizacao(TypedDict):
+    """Resultado da atualização de uma empresa"""
+    cnpj: str
+    razao_social: str
+    sucesso: bool
+    mensagem: str
+    diferencas: List[str]
+
+
+class DetalheModulos(TypedDict):
+    """Resultado da configuração de módulos de uma empresa"""
+    cnpj: str
+    razao_social: str
+    federal: str
+    servicos: str
+    sucesso: bool
+
+
+class CadastroStats(TypedDict):
+    """Estatísticas de CadastroService.cadastrar_em_lote"""
+    total: int
+    sucesso: int
+    ja_cadastrados: int
+    erros: int
+    detalhes: List[DetalheCadastro]
+
+
+class AtualizacaoStats(TypedDict):
+    """Estatísticas de AtualizacaoService.atualizar_em_lote"""
+    total: int
+    atualizados: int
+    sem_alteracao: int
+    nao_cadastrados: int
+    erros: int
+    detalhes: List[DetalheAtualizacao]
+
+
+class ModulosStats(TypedDict):
+    """Estatísticas de ModuloService.configurar_modulos_em_lote"""
+    total: int
+    federal_ativado: int
+    federal_desativado: int
+    servicos_ativado: int
+    servicos_desativado: int
+    erros: int
+    detalhes: List[DetalheModulos]
+
+
+class SyncStats(TypedDict):
+    """Estatísticas consolidadas do modo sync"""
+    cadastro: CadastroStats
+    atualizacao: AtualizacaoStats
+    modulos: Optional[ModulosStats]
@@ -1,60 +1,104 @@
 """
 Serviço de atualização de clientes existentes
 """
-import time
-from typing import Dict, Any, List, Tuple
+from typing import Callable, Dict, Any, List, Optional, Tuple
 
 import pandas as pd
 from pathlib import Path
 
 
 from ..models.empresa import Empresa
+from ..models.stats import AtualizacaoStats
 from ..core.api_client import JettaxAPI
-from ..services.regime_mapper import obter_regime_object_id
+from ..core.excel_reader import normalizar_coluna_cnpj
+from ..services.regime_mapper import obter_regime_object_id, resolver_regimes
 from ..services.comparacao_service import ComparacaoService
 from ..utils.logger import get_logger
-from ..utils.cnpj_utils import formatar_cnpj, somente_digitos
+from ..utils.cnpj_utils import formatar_cnpj
+from ..utils.lote import RateLimiter, executar_em_lote
+from ..utils.payload_log import PayloadLog
+from ..utils.estado_sync import EstadoSync
 
 logger = get_logger()
 
+# Linha dos cabeçalhos do resumo no log
+SEPARADOR = "=" * 60
+
 PLANILHA_PATH = r"G:\- CONTABILIDADE -\Automação\JETTAX\RELAÇÃO DE EMPRESAS.xlsx"
 
 
-def linha_para_empresa(row):
-    return Empresa(
-        cnpj=row["CNPJ"],
-        razao_social=row["Razao Social"],
-        regime=row.get("Regime", ""),
-        tributacao=row.get("Tributacao", ""),
-        inscricao_estadual=row.get("IE", ""),
-        inscricao_municipal=row.get("IM", ""),
-        nire=row.get("NIRE", ""),
-        ramo_atividade=row.get("Ramo atividade", ""),
-        responsavel=row.get("Responsável", ""),
-        email=row.get("e-mail", ""),
-        municipio=row.get("Municipio", ""),
-        data_cadastro=row.get("Data de Cadastro", ""),
-        cpf=row.get("CPF", ""),
-        senha=row.get("Senha", ""),
-        cadastro_jettax=row.get("Cadastro JETTAX", ""),
-        # Adicione outros campos conforme necessário no modelo Empresa
-    )
+# Colunas da planilha -> campos de Empresa
+COLUNAS_EMPRESA = (
+    ("CNPJ", "cnpj"),
+    ("Razao Social", "razao_social"),
+    ("Tributacao", "tributacao"),
+    ("IE", "ie"),
+    ("IM", "im"),
+    ("NIRE", "nire"),
+    ("Ramo atividade", "ramo_atividade"),
+    ("Responsável", "responsavel"),
+    ("e-mail", "email"),
+    ("Municipio", "municipio"),
+    ("Data de Cadastro", "data_cadastro"),
+    ("CPF", "cpf_prefeitura"),
+    ("Senha", "senha_prefeitura"),
+    ("Cadastro JETTAX", "cadastro_jettax"),
+)
+
+
+def empresas_da_planilha(df: pd.DataFrame) -> List[Empresa]:
+    """
+    Converte a planilha em empresas, renomeando as colunas uma única vez
+
+    Células vazias são omitidas, ficando com o valor padrão do modelo.
+    """
+    campos = dict(COLUNAS_EMPRESA)
+    df = df.rename(columns=lambda coluna: str(coluna).strip()).rename(columns=campos)
+    presentes = [campo for campo in campos.values() if campo in df.columns]
+
+    if "cnpj" in df.columns:
+        df["cnpj"] = normalizar_coluna_cnpj(df["cnpj"])
+
+    # Um tolist() por coluna e zip por linha: sem um dict intermediário do pandas por linha
+    colunas = df[presentes].fillna("").to_dict("list")
+    return [
+        Empresa(**{campo: valor for campo, valor in zip(presentes, linha) if valor != ""})
+        for linha in zip(*colunas.values())
+    ]
 
 
 class AtualizacaoService:
     """Serviço para atualização de clientes existentes"""
 
-    def __init__(self, api_client: JettaxAPI, dry_run: bool = False):
+    def __init__(
+        self,
+        api_client: JettaxAPI,
+        dry_run: bool = False,
+        debug_payloads: bool = False,
+        incremental: bool = False,
+    ):
         """
         Inicializa o serviço
 
         Args:
             api_client: Cliente da API JETTAX
             dry_run: Se True, não faz alterações reais
+            debug_payloads: Se True, registra cada payload enviado em debug_payloads/YYYYMMDD.jsonl
+            incremental: Se True, pula empresas sem mudança (planilha e updatedAt do JETTAX)
+                desde a última sincronização
         """
         self.api = api_client
         self.dry_run = dry_run
         self.comparador = ComparacaoService()
+        self.payload_log = PayloadLog() if debug_payloads else None
+        self.estado_sync = EstadoSync() if incremental else None
+        # Regimes resolvidos no início do lote em andamento
+        self._regimes_lote: Dict[str, Optional[str]] = {}
+
+    def _regime_object_id(self, tributacao: str) -> Optional[str]:
+        if tributacao in self._regimes_lote:
+            return self._regimes_lote[tributacao]
+        return obter_regime_object_id(tributacao, self.api)
 
     def atualizar_empresa(
         self, empresa: Empresa, cliente_jettax: Dict[str, Any]
@@ -80,25 +124,25 @@ class AtualizacaoService:
 
             if not tem_diferencas:
                 msg = "Dados iguais, nada a atualizar"
-                logger.info(f"[ATUALIZAÇÃO] {cnpj_formatado}: {msg}")
+                logger.info("[ATUALIZAÇÃO] %s: %s", cnpj_formatado, msg)
                 return True, msg, []
 
-            logger.info(f"[ATUALIZAÇÃO] {cnpj_formatado} - {empresa.razao_social}")
-            logger.info(f"  Diferenças encontradas: {len(diferencas)}")
+            logger.info("[ATUALIZAÇÃO] %s - %s", cnpj_formatado, empresa.razao_social)
+            logger.info("  Diferenças encontradas: %s", len(diferencas))
 
             for diff in diferencas:
-                logger.info(f"    - {diff}")
+                logger.info("    - %s", diff)
 
             # 2. Obter regime tributário
-            regime_object_id = obter_regime_object_id(empresa.tributacao, self.api)
+            regime_object_id = self._regime_object_id(empresa.tributacao)
 
             if not regime_object_id:
                 msg = f"Regime '{empresa.tributacao}' não encontrado no JETTAX"
-                logger.error(f"  ✗ {msg}")
+                logger.error("  ✗ %s", msg)
                 return False, msg, diferencas
 
             # 3. Buscar cliente COMPLETO (59 campos) para fazer PUT
-            logger.debug(f"  Buscando dados completos do cliente {client_id}...")
+            logger.debug("  Buscando dados completos do cliente %s...", client_id)
             cliente_completo = self.api.obter_cliente(client_id)
 
             # 4. Aplicar atualizações no objeto completo
@@ -122,149 +166,154 @@ class AtualizacaoService:
 
             # 5. Atualizar cliente (PUT com objeto completo)
             if self.dry_run:
-                logger.info(f"  🔍 [DRY-RUN] Atualizaria cliente {client_id}")
+                logger.info("  🔍 [DRY-RUN] Atualizaria cliente %s", client_id)
                 for diff in diferencas:
-                    logger.info(f"    - {diff}")
+                    logger.info("    - %s", diff)
                 return True, "Sucesso (dry-run)", diferencas
 
-            # DEBUG: Salvar payload antes de enviar
-            import json
-            from pathlib import Path
-            debug_dir = Path(__file__).parent.parent.parent / "debug_payloads"
-            debug_dir.mkdir(exist_ok=True)
-
-            from datetime import datetime
-
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            debug_file = debug_dir / f"update_{empresa.cnpj}_{timestamp}.json"
-
-            with open(debug_file, "w", encoding="utf-8") as f:
-                json.dump(
+            # DEBUG: registrar payload antes de enviar (gravado em segundo plano)
+            if self.payload_log:
+                self.payload_log.registrar(
                     {
                         "client_id": client_id,
                         "cnpj": empresa.cnpj,
                         "razao_social": empresa.razao_social,
                         "payload": cliente_atualizado,
                         "diferencas": diferencas,
-                    },
-                    f,
-                    indent=2,
-                    ensure_ascii=False,
+                    }
                 )
 
-            logger.debug(f"  📝 Payload salvo em: {debug_file}")
-
             self.api.atualizar_cliente(client_id, cliente_atualizado)
 
             msg = f"Atualizado com sucesso ({len(diferencas)} campos alterados)"
-            logger.info(f"  ✓ {msg}")
+            logger.info("  ✓ %s", msg)
 
             return True, msg, diferencas
 
         except Exception as e:
             msg = f"Erro: {str(e)}"
-            logger.error(f"  ✗ {msg}")
+            logger.error("  ✗ %s", msg)
             return False, msg, []
 
     def atualizar_em_lote(
-        self, empresas: List[Empresa], intervalo_segundos: float = 1.0
-    ) -> Dict[str, Any]:
+        self,
+        empresas: List[Empresa],
+        intervalo_segundos: float = 1.0,
+        max_workers: int = 1,
+        progress: Optional[Callable[[int, int], None]] = None,
+    ) -> AtualizacaoStats:
         """
         Atualiza múltiplas empresas em lote
 
         Args:
             empresas: Lista de empresas a atualizar
-            intervalo_segundos: Intervalo entre requisições
+            intervalo_segundos: Intervalo mínimo entre o início de duas atualizações
+            max_workers: Número de atualizações executadas simultaneamente
+            progress: Chamado com (concluídas, total) após cada empresa
 
         Returns:
             Estatísticas do processamento
         """
-        logger.info(f"Iniciando atualização em lote de {len(empresas)} empresas...")
+        logger.info("Iniciando atualização em lote de %s empresas...", len(empresas))
 
-        # Carregar todos os clientes do JETTAX
+        # Carregar todos os clientes do JETTAX, indexados por CNPJ
         logger.info("Carregando clientes do JETTAX...")
-        clientes_jettax = self.api.listar_todos_clientes()
-
-        # Criar índice por CNPJ
-        jettax_por_cnpj = {}
-        for cliente in clientes_jettax:
-            cnpj = somente_digitos(str(cliente.get("document", "")))
-            jettax_por_cnpj[cnpj] = cliente
+        jettax_por_cnpj = self.api.indice_clientes()
 
-        stats = {
+        stats: AtualizacaoStats = {
             "total": len(empresas),
             "atualizados": 0,
             "sem_alteracao": 0,
             "nao_cadastrados": 0,
             "erros": 0,
-            "detalhes": [],
+            # Tamanho conhecido: preenchida por índice em vez de crescer com append
+            "detalhes": [None] * len(empresas),
         }
 
-        for idx, empresa in enumerate(empresas, 1):
-            logger.info(f"\n[{idx}/{len(empresas)}]")
+        # Poucos regimes distintos por planilha: resolvidos uma vez, antes das threads
+        self._regimes_lote = resolver_regimes((e.tributacao for e in empresas), self.api)
 
-            cnpj = somente_digitos(empresa.cnpj)
+        limiter = RateLimiter(intervalo_segundos)
 
-            # Verificar se existe no JETTAX
-            if cnpj not in jettax_por_cnpj:
-                msg = "Não cadastrado no JETTAX"
-                logger.warning(f"[ATUALIZAÇÃO] {formatar_cnpj(empresa.cnpj)}: {msg}")
-                stats["nao_cadastrados"] += 1
+        estado = self.estado_sync
+        assinaturas = (
+            [EstadoSync.assinatura(e) for e in empresas] if estado else [None] * len(empresas)
+        )
 
-                stats["detalhes"].append(
-                    {
-                        "cnpj": empresa.cnpj,
-                        "razao_social": empresa.razao_social,
-                        "sucesso": False,
-                        "mensagem": msg,
-                        "diferencas": [],
-                    }
-                )
+        def processar(item: Tuple[Empresa, Optional[str]]) -> Optional[Tuple[bool, str, List[str]]]:
+            empresa, assinatura = item
+            # Empresa.cnpj já chega só com dígitos (validador do modelo)
+            cliente = jettax_por_cnpj.get(empresa.cnpj)
 
-                continue
+            # Não cadastrados não fazem requisições, então não consomem o intervalo
+            if cliente is None:
+                return None
 
-            cliente = jettax_por_cnpj[cnpj]
+            # Nada mudou dos dois lados desde a última comparação sem diferenças
+            if estado and estado.inalterado(empresa.cnpj, cliente.get("updatedAt"), assinatura):
+                return True, "Sem alteração desde a última sincronização", []
 
-            # Atualizar
-            sucesso, mensagem, diferencas = self.atualizar_empresa(empresa, cliente)
+            limiter.aguardar()
+            return self.atualizar_empresa(empresa, cliente)
 
-            if sucesso and diferencas:
-                stats["atualizados"] += 1
-            elif sucesso and not diferencas:
-                stats["sem_alteracao"] += 1
-            else:
-                stats["erros"] += 1
-
-            stats["detalhes"].append(
-                {
-                    "cnpj": empresa.cnpj,
-                    "razao_social": empresa.razao_social,
-                    "sucesso": sucesso,
-                    "mensagem": mensagem,
-                    "diferencas": diferencas,
-                }
-            )
+        resultados = executar_em_lote(processar, list(zip(empresas, assinaturas)), max_workers)
 
-            # Intervalo entre requisições
-            if idx < len(empresas):
-                time.sleep(intervalo_segundos)
+        for idx, (empresa, resultado) in enumerate(zip(empresas, resultados), 1):
+            if progress:
+                progress(idx, len(empresas))
 
-        logger.info("\n" + "=" * 60)
+            # Verificar se existe no JETTAX
+            if resultado is None:
+                sucesso, mensagem, diferencas = False, "Não cadastrado no JETTAX", []
+                logger.warning("[ATUALIZAÇÃO] %s: %s", formatar_cnpj(empresa.cnpj), mensagem)
+                stats["nao_cadastrados"] += 1
+            else:
+                sucesso, mensagem, diferencas = resultado
+
+                if sucesso and diferencas:
+                    stats["atualizados"] += 1
+                elif sucesso:
+                    stats["sem_alteracao"] += 1
+                    if estado:
+                        cliente = jettax_por_cnpj[empresa.cnpj]
+                        estado.registrar(empresa.cnpj, cliente.get("updatedAt"), assinaturas[idx - 1])
+                else:
+                    stats["erros"] += 1
+
+            # Um único ponto de montagem do detalhe, por índice na lista pré-alocada
+            stats["detalhes"][idx - 1] = {
+                "cnpj": empresa.cnpj,
+                "razao_social": empresa.razao_social,
+                "sucesso": sucesso,
+                "mensagem": mensagem,
+                "diferencas": diferencas,
+            }
+
+        self._regimes_lote = {}
+
+        if estado:
+            estado.salvar()
+
+        # Garante o arquivo de payloads completo ao fim do lote
+        if self.payload_log:
+            self.payload_log.fechar()
+
+        logger.info("\n" + SEPARADOR)
         logger.info("RESUMO DA ATUALIZAÇÃO")
-        logger.info("=" * 60)
+        logger.info(SEPARADOR)
         logger.info(f"Total: {stats['total']}")
         logger.info(f"✓ Atualizados: {stats['atualizados']}")
         logger.info(f"= Sem alteração: {stats['sem_alteracao']}")
         logger.info(f"⚠ Não cadastrados: {stats['nao_cadastrados']}")
         logger.info(f"✗ Erros: {stats['erros']}")
-        logger.info("=" * 60)
+        logger.info(SEPARADOR)
 
         return stats
 
 
 def main():
     df = pd.read_excel(PLANILHA_PATH, dtype=str)
-    empresas = [linha_para_empresa(row) for _, row in df.iterrows()]
+    empresas = empresas_da_planilha(df)
 
     api_client = JettaxAPI()  # Configure conforme necessário
     service = AtualizacaoService(api_client, dry_run=True)  # dry_run=True para teste
@@ -1,18 +1,22 @@
 """
 Serviço de cadastro de novos clientes no JETTAX
 """
-import time
-from typing import Dict, Any, List, Tuple, Optional
+from typing import Callable, Dict, Any, List, Tuple, Optional
 from pathlib import Path
 
 from ..models.empresa import Empresa
+from ..models.stats import CadastroStats
 from ..core.api_client import JettaxAPI
-from ..services.regime_mapper import obter_regime_object_id
+from ..services.regime_mapper import obter_regime_object_id, resolver_regimes
 from ..utils.logger import get_logger
 from ..utils.cnpj_utils import formatar_cnpj, somente_digitos
+from ..utils.lote import RateLimiter, executar_em_lote
 
 logger = get_logger()
 
+# Linha dos cabeçalhos do resumo no log
+SEPARADOR = "=" * 60
+
 
 class CadastroService:
     """Serviço para cadastro de novos clientes"""
@@ -27,6 +31,13 @@ class CadastroService:
         """
         self.api = api_client
         self.dry_run = dry_run
+        # Regimes resolvidos no início do lote em andamento
+        self._regimes_lote: Dict[str, Optional[str]] = {}
+    
+    def _regime_object_id(self, tributacao: str) -> Optional[str]:
+        if tributacao in self._regimes_lote:
+            return self._regimes_lote[tributacao]
+        return obter_regime_object_id(tributacao, self.api)
     
     def enriquecer_com_receita(self, empresa: Empresa) -> Tuple[Empresa, Optional[Dict]]:
         """
@@ -38,12 +49,12 @@ class CadastroService:
         Returns:
             Tupla (empresa_atualizada, dados_receita)
         """
-        logger.debug(f"Consultando Receita Federal para {formatar_cnpj(empresa.cnpj)}")
+        logger.debug("Consultando Receita Federal para %s", formatar_cnpj(empresa.cnpj))
         
         dados_receita = self.api.consultar_cnpj_receita(empresa.cnpj)
         
         if not dados_receita:
-            logger.warning(f"CNPJ {formatar_cnpj(empresa.cnpj)} não encontrado na Receita")
+            logger.warning("CNPJ %s não encontrado na Receita", formatar_cnpj(empresa.cnpj))
             return empresa, None
         
         # Enriquecer dados
@@ -118,7 +129,7 @@ class CadastroService:
         if empresa.precisa_credenciais_prefeitura():
             if not empresa.tem_credenciais_completas():
                 logger.warning(
-                    f"{formatar_cnpj(empresa.cnpj)}: Regime de serviços sem credenciais de prefeitura"
+                    "%s: Regime de serviços sem credenciais de prefeitura", formatar_cnpj(empresa.cnpj)
                 )
             else:
                 payload["login"] = empresa.cpf_prefeitura
@@ -140,24 +151,24 @@ class CadastroService:
         
         try:
             # 1. Verificar se já existe
-            logger.info(f"[CADASTRO] {cnpj_formatado} - {empresa.razao_social}")
+            logger.info("[CADASTRO] %s - %s", cnpj_formatado, empresa.razao_social)
             
             cliente_existente = self.api.buscar_cliente_por_cnpj(empresa.cnpj)
             
             if cliente_existente:
                 msg = f"Já cadastrado (ID: {cliente_existente.get('id', 'N/A')})"
-                logger.info(f"  ⚠ {msg}")
+                logger.info("  ⚠ %s", msg)
                 return False, msg
             
             # 2. Enriquecer com Receita Federal
             empresa, dados_receita = self.enriquecer_com_receita(empresa)
             
             # 3. Obter regime tributário
-            regime_object_id = obter_regime_object_id(empresa.tributacao, self.api)
+            regime_object_id = self._regime_object_id(empresa.tributacao)
             
             if not regime_object_id:
                 msg = f"Regime '{empresa.tributacao}' não encontrado no JETTAX"
-                logger.error(f"  ✗ {msg}")
+                logger.error("  ✗ %s", msg)
                 return False, msg
             
             # 4. Obter código IBGE
@@ -172,7 +183,7 @@ class CadastroService:
             
             if not codigo_ibge:
                 msg = f"Código IBGE não encontrado para {empresa.municipio}"
-                logger.warning(f"  ⚠ {msg}")
+                logger.warning("  ⚠ %s", msg)
                 # Tentar continuar mesmo sem código IBGE
                 codigo_ibge = 0
             
@@ -181,51 +192,63 @@ class CadastroService:
             
             # 6. Criar cliente
             if self.dry_run:
-                logger.info(f"  🔍 [DRY-RUN] Criaria cliente com payload: {payload}")
+                logger.info("  🔍 [DRY-RUN] Criaria cliente com payload: %s", payload)
                 return True, "Sucesso (dry-run)"
             
             resultado = self.api.criar_cliente(payload)
             
             msg = f"Cadastrado com sucesso (ID: {resultado.get('id', 'N/A')})"
-            logger.info(f"  ✓ {msg}")
+            logger.info("  ✓ %s", msg)
             
             return True, msg
             
         except Exception as e:
             msg = f"Erro: {str(e)}"
-            logger.error(f"  ✗ {msg}")
+            logger.error("  ✗ %s", msg)
             return False, msg
     
     def cadastrar_em_lote(
         self,
         empresas: List[Empresa],
-        intervalo_segundos: float = 1.0
-    ) -> Dict[str, Any]:
+        intervalo_segundos: float = 1.0,
+        max_workers: int = 1,
+        progress: Optional[Callable[[int, int], None]] = None
+    ) -> CadastroStats:
         """
         Cadastra múltiplas empresas em lote
         
         Args:
             empresas: Lista de empresas a cadastrar
-            intervalo_segundos: Intervalo entre requisições
+            intervalo_segundos: Intervalo mínimo entre o início de dois cadastros
+            max_workers: Número de cadastros executados simultaneamente
+            progress: Chamado com (concluídas, total) após cada empresa
         
         Returns:
             Estatísticas do processamento
         """
-        logger.info(f"Iniciando cadastro em lote de {len(empresas)} empresas...")
+        logger.info("Iniciando cadastro em lote de %s empresas...", len(empresas))
         
-        stats = {
+        stats: CadastroStats = {
             "total": len(empresas),
             "sucesso": 0,
             "ja_cadastrados": 0,
             "erros": 0,
-            "detalhes": []
+            # Tamanho conhecido: preenchida por índice em vez de crescer com append
+            "detalhes": [None] * len(empresas)
         }
         
-        for idx, empresa in enumerate(empresas, 1):
-            logger.info(f"\n[{idx}/{len(empresas)}]")
-            
-            sucesso, mensagem = self.cadastrar_empresa(empresa)
-            
+        # Poucos regimes distintos por planilha: resolvidos uma vez, antes das threads
+        self._regimes_lote = resolver_regimes((e.tributacao for e in empresas), self.api)
+        
+        limiter = RateLimiter(intervalo_segundos)
+        
+        def processar(empresa: Empresa) -> Tuple[bool, str]:
+            limiter.aguardar()
+            return self.cadastrar_empresa(empresa)
+        
+        resultados = executar_em_lote(processar, empresas, max_workers)
+        
+        for idx, (empresa, (sucesso, mensagem)) in enumerate(zip(empresas, resultados), 1):
             if sucesso:
                 stats["sucesso"] += 1
             elif "já cadastrado" in mensagem.lower():
@@ -233,24 +256,25 @@ class CadastroService:
             else:
                 stats["erros"] += 1
             
-            stats["detalhes"].append({
+            stats["detalhes"][idx - 1] = {
                 "cnpj": empresa.cnpj,
                 "razao_social": empresa.razao_social,
                 "sucesso": sucesso,
                 "mensagem": mensagem
-            })
+            }
             
-            # Intervalo entre requisições
-            if idx < len(empresas):
-                time.sleep(intervalo_segundos)
+            if progress:
+                progress(idx, len(empresas))
+        
+        self._regimes_lote = {}
         
-        logger.info("\n" + "=" * 60)
+        logger.info("\n" + SEPARADOR)
         logger.info("RESUMO DO CADASTRO")
-        logger.info("=" * 60)
+        logger.info(SEPARADOR)
         logger.info(f"Total: {stats['total']}")
         logger.info(f"✓ Cadastrados: {stats['sucesso']}")
         logger.info(f"⚠ Já existiam: {stats['ja_cadastrados']}")
         logger.info(f"✗ Erros: {stats['erros']}")
-        logger.info("=" * 60)
+        logger.info(SEPARADOR)
         
         return stats
@@ -9,18 +9,26 @@ O módulo cobre:
 """
 from __future__ import annotations
 
+import csv
+import io
 import os
+import time
 from dataclasses import dataclass, field
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple, Union
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple, Union
 
+import orjson
 import pandas as pd
 import requests
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
+from src.core.api_client import TOKEN_MARGEM_SEGUNDOS, JettaxAPI
 from src.utils.cnpj_utils import normalizar_cnpj, somente_digitos
 from src.utils.logger import get_logger
+from src.utils.lote import executar_em_lote
 
 logger = get_logger()
 
@@ -34,19 +42,59 @@ EMAIL = os.getenv("JETTAX_EMAIL")
 PASSWORD = os.getenv("JETTAX_PASSWORD")
 DEFAULT_SPREADSHEET = os.getenv("JETTAX_SPREADSHEET", "RELAÇÃO DE EMPRESAS.xlsx")
 
+# Cabeçalho dos POST/PUT com corpo já serializado (mesclado aos da sessão pelo requests)
+JSON_HEADERS = {"Content-Type": "application/json"}
 
-@dataclass
+# Status transitórios repetidos pelo adapter HTTP
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+def create_session() -> requests.Session:
+    """Sessão HTTP com pool de conexões (keep-alive) e retry para falhas transitórias."""
+
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=16,
+        pool_maxsize=64,
+        max_retries=Retry(
+            total=5,
+            backoff_factor=0.5,
+            status_forcelist=RETRY_STATUS,
+            # POST fica de fora: repetir um cadastro que chegou a ser gravado duplicaria o cliente
+            allowed_methods=frozenset({"GET", "PUT"}),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        ),
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+# Último token obtido por authenticate (expiração lida do claim exp do JWT)
+_TOKEN_CACHE: Dict[str, Any] = {"token": None, "expires_at": 0.0}
+
+# Sessão padrão do módulo: login, listagem e POST/PUT reaproveitam as mesmas conexões
+_SESSION = create_session()
+
+
+# Colunas do resumo (tabela na interface e relatório CSV)
+SUMMARY_COLUMNS = ["CNPJ", "Ação", "Mensagem", "Status", "Payload"]
+
+
+@dataclass(slots=True)
 class SyncEntry:
     """Representa uma ação realizada durante a sincronização."""
 
     cnpj: str
     action: str
     message: str
-    payload: Dict[str, Any] = field(default_factory=dict)
+    # None quando não há payload (linhas ignoradas): evita um dict vazio por entrada
+    payload: Optional[Dict[str, Any]] = None
     status: str = "ok"
 
 
-@dataclass
+@dataclass(slots=True)
 class SyncLog:
     """Registra todas as ações executadas."""
 
@@ -68,19 +116,13 @@ class SyncLog:
     def all_entries(self) -> List[SyncEntry]:
         return self.created + self.updated + self.skipped + self.errors
 
+    def rows(self) -> Iterator[Tuple[str, str, str, str, Dict[str, Any]]]:
+        """Uma tupla por entrada, na ordem de SUMMARY_COLUMNS."""
+        for e in self.all_entries:
+            yield e.cnpj, e.action, e.message, e.status, e.payload or {}
+
     def summary_dataframe(self) -> pd.DataFrame:
-        return pd.DataFrame(
-            [
-                {
-                    "CNPJ": e.cnpj,
-                    "Ação": e.action,
-                    "Mensagem": e.message,
-                    "Status": e.status,
-                    "Payload": e.payload,
-                }
-                for e in self.all_entries
-            ]
-        )
+        return pd.DataFrame(list(self.rows()), columns=SUMMARY_COLUMNS)
 
 
 def authenticate(session: Optional[requests.Session] = None) -> Tuple[requests.Session, str]:
@@ -89,7 +131,14 @@ def authenticate(session: Optional[requests.Session] = None) -> Tuple[requests.S
     if not EMAIL or not PASSWORD:
         raise RuntimeError("Defina JETTAX_EMAIL e JETTAX_PASSWORD no .env")
 
-    session = session or requests.Session()
+    session = session or _SESSION
+
+    # Token ainda válido de uma autenticação anterior neste processo: só aplica na sessão
+    token = _TOKEN_CACHE["token"]
+    if token and time.time() < _TOKEN_CACHE["expires_at"] - TOKEN_MARGEM_SEGUNDOS:
+        session.headers.update({"Authorization": f"Bearer {token}", "Accept": "application/json"})
+        return session, token
+
     payload = {"email": EMAIL, "password": PASSWORD, "isCheckMFA": False}
     url = f"{AUTH_URL}/api/jettax360/v1/auth/office/login"
 
@@ -106,11 +155,45 @@ def authenticate(session: Optional[requests.Session] = None) -> Tuple[requests.S
     if not token:
         raise RuntimeError("Token de autenticação não encontrado na resposta")
 
+    _TOKEN_CACHE.update(token=token, expires_at=JettaxAPI._expiracao_token(token))
     session.headers.update({"Authorization": f"Bearer {token}", "Accept": "application/json"})
     logger.info("Autenticação concluída com sucesso.")
     return session, token
 
 
+# Cabeçalhos aceitos na planilha (minúsculos, sem espaços nas pontas) -> coluna normalizada
+COLUMN_ALIASES = {
+    "cnpj": "cnpj",
+    "cnp": "cnpj",
+    "document": "cnpj",
+    "razão social": "name",
+    "razao social": "name",
+    "empresa": "name",
+    "nome": "name",
+    "cidade": "city",
+    "municipio": "city",
+    "município": "city",
+    "estado": "state",
+    "uf": "state",
+    "regime": "regime",
+    "tributação": "regime",
+    "taxation": "regime",
+    "inscrição municipal": "municipalRegistration",
+    "inscricao municipal": "municipalRegistration",
+    "im": "municipalRegistration",
+}
+
+
+# Colunas da planilha normalizada, na ordem lida por sync_clients
+ROW_COLUMNS = ["cnpj", "name", "city", "state", "regime", "municipalRegistration"]
+
+# Campos do cliente na API correspondentes a ROW_COLUMNS[1:]
+SYNC_FIELDS = ("name", "city", "state", "taxation", "municipalRegistration")
+
+# Colunas de texto comparadas sem diferenciar maiúsculas/espaços nas pontas
+TEXT_COLUMNS = ("name", "city", "state", "regime")
+
+
 def _normalize_text(value: Any) -> str:
     if value is None:
         return ""
@@ -120,57 +203,61 @@ def _normalize_text(value: Any) -> str:
 def normalize_dataframe(df: pd.DataFrame) -> pd.DataFrame:
     """Normaliza colunas e valores da planilha."""
 
-    rename_map = {
-        "cnpj": "cnpj",
-        "cnp": "cnpj",
-        "document": "cnpj",
-        "razão social": "name",
-        "razao social": "name",
-        "empresa": "name",
-        "nome": "name",
-        "cidade": "city",
-        "municipio": "city",
-        "município": "city",
-        "estado": "state",
-        "uf": "state",
-        "regime": "regime",
-        "tributação": "regime",
-        "taxation": "regime",
-        "inscrição municipal": "municipalRegistration",
-        "inscricao municipal": "municipalRegistration",
-        "im": "municipalRegistration",
-    }
-
     normalized_columns = {}
     for col in df.columns:
         key = str(col).strip().lower()
-        normalized_columns[col] = rename_map.get(key, key)
+        normalized_columns[col] = COLUMN_ALIASES.get(key, key)
     df = df.rename(columns=normalized_columns)
 
-    required = ["cnpj", "name", "city", "state", "regime", "municipalRegistration"]
-    for col in required:
+    for col in ROW_COLUMNS:
         if col not in df.columns:
             df[col] = ""
 
-    df["cnpj"] = df["cnpj"].apply(normalizar_cnpj)
-    df["name"] = df["name"].apply(_normalize_text)
-    df["city"] = df["city"].apply(_normalize_text)
-    df["state"] = df["state"].apply(_normalize_text)
-    df["regime"] = df["regime"].apply(_normalize_text)
-    df["municipalRegistration"] = df["municipalRegistration"].apply(lambda v: somente_digitos(str(v)))
+    # Mesma regra de normalizar_cnpj, usada no lado da API (_client_cnpj): só dígitos, sem
+    # completar zeros, para que documentos fora de 14 dígitos (ex.: CPF) continuem
+    # encontrando o cliente existente em vez de serem recriados com outro documento
+    df["cnpj"] = df["cnpj"].astype("string").str.replace(r"\D+", "", regex=True).fillna("").astype(object)
+    # Mesma regra de _normalize_text, coluna inteira de uma vez (células vazias viram "")
+    for col in TEXT_COLUMNS:
+        df[col] = df[col].astype("string").str.strip().str.upper().fillna("").astype(object)
+    df["municipalRegistration"] = (
+        df["municipalRegistration"].astype("string").str.replace(r"\D+", "", regex=True).fillna("").astype(object)
+    )
 
     df = df[df["cnpj"] != ""]
     df = df.drop_duplicates(subset=["cnpj"], keep="first")
+
+    fora_do_padrao = int((df["cnpj"].str.len() != 14).sum())
+    if fora_do_padrao:
+        logger.warning("%s linha(s) com documento fora do padrão de 14 dígitos do CNPJ.", fora_do_padrao)
     return df
 
 
-def read_spreadsheet(source: Union[str, Path, bytes]) -> pd.DataFrame:
-    """Lê a planilha (caminho ou bytes) e devolve DataFrame normalizado."""
+def _excel_source(source: Union[str, Path, bytes, BinaryIO]) -> Union[str, Path, BinaryIO]:
+    """Caminho como está; bytes e streams sem seek viram um buffer em memória posicionado no início."""
 
     if isinstance(source, (str, Path)):
-        df = pd.read_excel(source)
-    else:
-        df = pd.read_excel(source)
+        return source
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return io.BytesIO(source)
+    if not source.seekable():
+        return io.BytesIO(source.read())
+    source.seek(0)
+    return source
+
+
+def read_spreadsheet(source: Union[str, Path, bytes, BinaryIO]) -> pd.DataFrame:
+    """Lê a planilha (caminho, bytes ou arquivo aberto) e devolve DataFrame normalizado."""
+
+    source = _excel_source(source)
+
+    # Só a primeira aba e as colunas usadas, tudo como texto (sem inferência de tipos)
+    df = pd.read_excel(
+        source,
+        sheet_name=0,
+        usecols=lambda col: str(col).strip().lower() in COLUMN_ALIASES,
+        dtype="string",
+    )
 
     return normalize_dataframe(df)
 
@@ -188,46 +275,65 @@ def fetch_existing_clients(session: requests.Session) -> Dict[str, Dict[str, Any
     else:
         clients = data
 
-    indexed: Dict[str, Dict[str, Any]] = {}
-    for item in clients or []:
-        cnpj = normalizar_cnpj(item.get("document") or item.get("cnpj"))
-        if cnpj:
-            indexed[cnpj] = item
-    return indexed
-
-
-def _build_create_payload(row: pd.Series) -> Dict[str, Any]:
-    return {
-        "document": row.get("cnpj"),
-        "name": row.get("name"),
-        "city": row.get("city"),
-        "state": row.get("state"),
-        "taxation": row.get("regime"),
-        "municipalRegistration": row.get("municipalRegistration", ""),
-        "isActive": True,
-    }
-
-
-def _diff_fields(row: pd.Series, existing: Dict[str, Any]) -> Dict[str, Any]:
-    fields = {
-        "name": row.get("name"),
-        "city": row.get("city"),
-        "state": row.get("state"),
-        "taxation": row.get("regime"),
-        "municipalRegistration": row.get("municipalRegistration", ""),
-    }
-
-    changes = {}
-    for key, value in fields.items():
-        existing_value = existing.get(key) or existing.get(key[0].upper() + key[1:])
+    return {cnpj: item for item in clients or [] if (cnpj := _client_cnpj(item))}
+
+
+def _client_cnpj(item: Dict[str, Any]) -> str:
+    """CNPJ do cliente da API; a API normalmente já envia os 14 dígitos limpos."""
+
+    doc = item.get("document") or item.get("cnpj")
+    if isinstance(doc, str) and len(doc) == 14 and doc.isdecimal():
+        return doc
+    return normalizar_cnpj(doc)
+
+
+def _build_create_payload(cnpj: str, fields: Dict[str, Any]) -> Dict[str, Any]:
+    return {"document": cnpj, **fields, "isActive": True}
+
+
+def _existing_fields(existing: Dict[str, Any]) -> Tuple[str, ...]:
+    """Campos comparáveis do cliente da API (ordem de SYNC_FIELDS), normalizados como a planilha."""
+
+    normalized = []
+    for key in SYNC_FIELDS:
+        value = existing.get(key) or existing.get(key[0].upper() + key[1:])
         if key == "municipalRegistration":
-            if somente_digitos(existing_value) != somente_digitos(value):
-                changes[key] = value
-            continue
+            normalized.append(somente_digitos(value))
+        else:
+            normalized.append(_normalize_text(value))
+    return tuple(normalized)
 
-        if _normalize_text(existing_value) != _normalize_text(value):
-            changes[key] = value
-    return changes
+
+def _diff_fields(values: Tuple[Any, ...], existing: Tuple[str, ...]) -> Dict[str, Any]:
+    """Campos da linha que diferem do cliente (ambos os lados já normalizados)."""
+
+    # Caso comum, nada mudou: uma comparação de tuplas, sem montar o dict
+    if values == existing:
+        return {}
+
+    return {key: value for key, value, current in zip(SYNC_FIELDS, values, existing) if value != current}
+
+
+def _send(session: requests.Session, entry: SyncEntry, client_id: Optional[str]) -> SyncEntry:
+    """Executa o POST/PUT planejado para a entrada e devolve a entrada final."""
+
+    creating = entry.action == "created"
+    # Corpo serializado com orjson (em C, já em bytes) em vez do json= do requests
+    body = orjson.dumps(entry.payload)
+    try:
+        if creating:
+            resp = session.post(f"{API_URL}/api/v1/clients", data=body, headers=JSON_HEADERS, timeout=30)
+        else:
+            resp = session.put(
+                f"{API_URL}/api/v1/clients/{client_id}", data=body, headers=JSON_HEADERS, timeout=30
+            )
+        resp.raise_for_status()
+    except requests.RequestException as exc:
+        verb = "criar" if creating else "atualizar"
+        return SyncEntry(entry.cnpj, "error", f"Erro ao {verb}: {exc}", status="error", payload=entry.payload)
+
+    entry.message = "Cliente criado com sucesso" if creating else "Cliente atualizado com sucesso"
+    return entry
 
 
 def sync_clients(
@@ -236,66 +342,54 @@ def sync_clients(
     *,
     dry_run: bool = False,
     progress: Optional[callable] = None,
+    max_workers: int = 1,
 ) -> SyncLog:
-    """Compara dados da planilha com a API e cria/atualiza conforme necessário."""
+    """Compara dados da planilha com a API e cria/atualiza conforme necessário.
+
+    Todas as linhas são classificadas (criar/atualizar/ignorar) antes de qualquer
+    requisição; depois os POST/PUT são enviados com até `max_workers` simultâneos.
+    O log e o `progress` seguem a ordem da planilha.
+    """
 
     log = SyncLog()
     existing_clients = fetch_existing_clients(session)
 
-    for _, row in df.iterrows():
-        cnpj = row.get("cnpj")
+    # Partição novos x já cadastrados numa passada sobre a coluna
+    registered = df["cnpj"].isin(set(existing_clients))
+
+    planned: List[Tuple[SyncEntry, Optional[str]]] = []
+    # Tuplas simples em vez de uma Series por linha
+    rows = df[ROW_COLUMNS].itertuples(index=False, name=None)
+    for row, is_registered in zip(rows, registered):
+        cnpj, values = row[0], row[1:]
         if not cnpj:
-            entry = SyncEntry("", "skipped", "Linha sem CNPJ", status="ignored")
-            log.add(entry)
-            if progress:
-                progress(entry)
+            planned.append((SyncEntry("", "skipped", "Linha sem CNPJ", status="ignored"), None))
             continue
 
-        existing = existing_clients.get(cnpj)
-        if not existing:
-            payload = _build_create_payload(row)
+        if not is_registered:
+            payload = _build_create_payload(cnpj, dict(zip(SYNC_FIELDS, values)))
             message = "[DRY-RUN] Criaria cliente" if dry_run else "Cliente criado"
-            entry = SyncEntry(cnpj, "created", message, payload=payload)
-            if not dry_run:
-                try:
-                    resp = session.post(f"{API_URL}/api/v1/clients", json=payload, timeout=30)
-                    resp.raise_for_status()
-                    entry.message = "Cliente criado com sucesso"
-                except requests.HTTPError as exc:
-                    entry = SyncEntry(cnpj, "error", f"Erro ao criar: {exc}", status="error", payload=payload)
-                    log.add(entry)
-                    if progress:
-                        progress(entry)
-                    continue
-            log.add(entry)
-            if progress:
-                progress(entry)
+            planned.append((SyncEntry(cnpj, "created", message, payload=payload), None))
             continue
 
-        changes = _diff_fields(row, existing)
+        existing = existing_clients[cnpj]
+        # A planilha não tem CNPJs repetidos: cada cliente é normalizado no máximo uma vez
+        changes = _diff_fields(values, _existing_fields(existing))
         if not changes:
-            entry = SyncEntry(cnpj, "skipped", "Sem alterações necessárias", status="ok")
-            log.add(entry)
-            if progress:
-                progress(entry)
+            planned.append((SyncEntry(cnpj, "skipped", "Sem alterações necessárias", status="ok"), None))
             continue
 
         message = "[DRY-RUN] Atualizaria cliente" if dry_run else "Cliente atualizado"
-        entry = SyncEntry(cnpj, "updated", message, payload=changes)
-
-        if not dry_run:
-            try:
-                client_id = existing.get("id") or existing.get("_id")
-                resp = session.put(f"{API_URL}/api/v1/clients/{client_id}", json=changes, timeout=30)
-                resp.raise_for_status()
-                entry.message = "Cliente atualizado com sucesso"
-            except requests.HTTPError as exc:
-                entry = SyncEntry(cnpj, "error", f"Erro ao atualizar: {exc}", status="error", payload=changes)
-                log.add(entry)
-                if progress:
-                    progress(entry)
-                continue
+        client_id = existing.get("id") or existing.get("_id")
+        planned.append((SyncEntry(cnpj, "updated", message, payload=changes), client_id))
 
+    def execute(item: Tuple[SyncEntry, Optional[str]]) -> SyncEntry:
+        entry, client_id = item
+        if dry_run or entry.action not in ("created", "updated"):
+            return entry
+        return _send(session, entry, client_id)
+
+    for entry in executar_em_lote(execute, planned, max_workers):
         log.add(entry)
         if progress:
             progress(entry)
@@ -304,17 +398,18 @@ def sync_clients(
 
 
 def run_sync_from_source(
-    source: Union[str, Path, bytes],
+    source: Union[str, Path, bytes, BinaryIO],
     *,
     dry_run: bool = False,
     session: Optional[requests.Session] = None,
     progress: Optional[callable] = None,
+    max_workers: int = 1,
 ) -> SyncLog:
     """Fluxo completo: autentica, lê planilha e executa sincronização."""
 
     session, _ = authenticate(session)
     df = read_spreadsheet(source)
-    return sync_clients(df, session, dry_run=dry_run, progress=progress)
+    return sync_clients(df, session, dry_run=dry_run, progress=progress, max_workers=max_workers)
 
 
 def save_report(log: SyncLog, reports_dir: Union[str, Path] = "reports") -> Path:
@@ -324,12 +419,21 @@ def save_report(log: SyncLog, reports_dir: Union[str, Path] = "reports") -> Path
     reports_path.mkdir(parents=True, exist_ok=True)
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     report_path = reports_path / f"sync_report_{timestamp}.csv"
-    log.summary_dataframe().to_csv(report_path, index=False, encoding="utf-8")
+
+    # Gravado linha a linha, sem montar um DataFrame; o payload vai como JSON
+    with report_path.open("w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(SUMMARY_COLUMNS)
+        writer.writerows(
+            (cnpj, action, message, status, orjson.dumps(payload).decode())
+            for cnpj, action, message, status, payload in log.rows()
+        )
     return report_path
 
 
 __all__ = [
     "authenticate",
+    "create_session",
     "fetch_existing_clients",
     "normalize_dataframe",
     "read_spreadsheet",
@@ -1,7 +1,7 @@
 """
 Serviço de comparação entre dados da planilha e JETTAX
 """
-from typing import Dict, Any, List, Tuple
+from typing import Callable, Dict, Any, List, Tuple, Union
 from ..models.empresa import Empresa
 from ..utils.logger import get_logger
 from ..utils.cnpj_utils import somente_digitos
@@ -9,6 +9,66 @@ from ..utils.cnpj_utils import somente_digitos
 logger = get_logger()
 
 
+def _nome(valor: Any) -> str:
+    """Regime e cidade no JETTAX podem vir como objeto ({"name": ...}) ou texto"""
+    if isinstance(valor, dict):
+        valor = valor.get("name", "")
+    return str(valor)
+
+
+def _ie_planilha(empresa: Empresa) -> str:
+    ie = empresa.get_ie_numerico()
+    return str(ie) if ie else ""
+
+
+def _ie_jettax(cliente: Dict[str, Any]) -> str:
+    ie = cliente.get("stateRegistration")
+    return str(ie) if ie else ""
+
+
+def _mesmo(valor: str) -> str:
+    return valor
+
+
+# Campos comparados: (rótulo, valor na planilha, valor no JETTAX, chave de comparação)
+# Os valores aparecem na mensagem de diferença; a chave só decide se diferem
+CAMPOS: Tuple[
+    Tuple[str, Callable[[Empresa], str], Callable[[Dict[str, Any]], str], Callable[[str], str]], ...
+] = (
+    (
+        "Razão Social",
+        lambda e: e.razao_social.strip().upper(),
+        lambda c: str(c.get("name", "")).strip().upper(),
+        _mesmo,
+    ),
+    (
+        "Tributação",
+        lambda e: e.tributacao.strip(),
+        lambda c: _nome(c.get("taxation", {})).strip(),
+        _mesmo,
+    ),
+    ("IE", _ie_planilha, _ie_jettax, _mesmo),
+    (
+        "IM",
+        lambda e: e.im or "",
+        lambda c: str(c.get("municipalRegistration", "")),
+        str.strip,
+    ),
+    (
+        "E-mail",
+        lambda e: e.email or "",
+        lambda c: str(c.get("email", "")),
+        lambda v: v.strip().lower(),
+    ),
+    (
+        "Município",
+        lambda e: e.municipio.strip().upper(),
+        lambda c: _nome(c.get("city", {})).strip().upper(),
+        _mesmo,
+    ),
+)
+
+
 class ComparacaoService:
     """Serviço para comparar dados entre planilha e JETTAX"""
     
@@ -43,78 +103,12 @@ class ComparacaoService:
         """
         diferencas = []
         
-        # Razão Social
-        razao_planilha = empresa_planilha.razao_social.strip().upper()
-        razao_jettax = str(cliente_jettax.get("name", "")).strip().upper()
-        
-        if razao_planilha != razao_jettax:
-            diferencas.append(
-                f"Razão Social: '{razao_jettax}' → '{razao_planilha}'"
-            )
-        
-        # Tributação
-        tributacao_planilha = empresa_planilha.tributacao.strip()
-        
-        # Regime no JETTAX pode estar em 'taxation' ou 'taxRegime.name'
-        regime_jettax = cliente_jettax.get("taxation", {})
-        if isinstance(regime_jettax, dict):
-            tributacao_jettax = regime_jettax.get("name", "")
-        else:
-            tributacao_jettax = str(regime_jettax)
-        
-        tributacao_jettax = str(tributacao_jettax).strip()
-        
-        if tributacao_planilha != tributacao_jettax:
-            diferencas.append(
-                f"Tributação: '{tributacao_jettax}' → '{tributacao_planilha}'"
-            )
-        
-        # IE
-        ie_planilha = empresa_planilha.get_ie_numerico()
-        ie_jettax = cliente_jettax.get("stateRegistration")
-        
-        # Converter para string para comparação
-        ie_planilha_str = str(ie_planilha) if ie_planilha else ""
-        ie_jettax_str = str(ie_jettax) if ie_jettax else ""
-        
-        if ie_planilha_str != ie_jettax_str:
-            diferencas.append(
-                f"IE: '{ie_jettax_str}' → '{ie_planilha_str}'"
-            )
-        
-        # IM
-        im_planilha = empresa_planilha.im or ""
-        im_jettax = str(cliente_jettax.get("municipalRegistration", ""))
-        
-        if im_planilha.strip() != im_jettax.strip():
-            diferencas.append(
-                f"IM: '{im_jettax}' → '{im_planilha}'"
-            )
-        
-        # E-mail
-        email_planilha = empresa_planilha.email or ""
-        email_jettax = str(cliente_jettax.get("email", ""))
-        
-        if email_planilha.strip().lower() != email_jettax.strip().lower():
-            diferencas.append(
-                f"E-mail: '{email_jettax}' → '{email_planilha}'"
-            )
-        
-        # Município
-        municipio_planilha = empresa_planilha.municipio.strip().upper()
-        
-        cidade_jettax = cliente_jettax.get("city", {})
-        if isinstance(cidade_jettax, dict):
-            municipio_jettax = cidade_jettax.get("name", "")
-        else:
-            municipio_jettax = str(cidade_jettax)
-        
-        municipio_jettax = municipio_jettax.strip().upper()
-        
-        if municipio_planilha != municipio_jettax:
-            diferencas.append(
-                f"Município: '{municipio_jettax}' → '{municipio_planilha}'"
-            )
+        for rotulo, valor_planilha, valor_jettax, chave in CAMPOS:
+            planilha = valor_planilha(empresa_planilha)
+            jettax = valor_jettax(cliente_jettax)
+            
+            if chave(planilha) != chave(jettax):
+                diferencas.append(f"{rotulo}: '{jettax}' → '{planilha}'")
         
         tem_diferencas = len(diferencas) > 0
         
@@ -171,36 +165,39 @@ class ComparacaoService:
     def detectar_empresas_divergentes(
         self,
         empresas_planilha: List[Empresa],
-        clientes_jettax: List[Dict[str, Any]]
+        clientes_jettax: Union[List[Dict[str, Any]], Dict[str, Dict[str, Any]]]
     ) -> List[Tuple[Empresa, Dict[str, Any], List[str]]]:
         """
         Detecta empresas com divergências entre planilha e JETTAX
         
         Args:
             empresas_planilha: Lista de empresas da planilha
-            clientes_jettax: Lista de clientes do JETTAX
+            clientes_jettax: Lista de clientes do JETTAX, ou o índice CNPJ -> cliente
+                já montado (JettaxAPI.indice_clientes), que é reaproveitado sem cópia
         
         Returns:
             Lista de tuplas (empresa, cliente, diferenças)
         """
         logger.info("Detectando divergências entre planilha e JETTAX...")
         
-        # Criar índice por CNPJ
-        jettax_por_cnpj = {}
-        for cliente in clientes_jettax:
-            cnpj = somente_digitos(str(cliente.get("document", "")))
-            jettax_por_cnpj[cnpj] = cliente
+        # Criar índice por CNPJ (se ainda não veio pronto)
+        if isinstance(clientes_jettax, dict):
+            jettax_por_cnpj = clientes_jettax
+        else:
+            jettax_por_cnpj = {
+                somente_digitos(str(cliente.get("document", ""))): cliente
+                for cliente in clientes_jettax
+            }
         
         divergentes = []
         
         for empresa in empresas_planilha:
-            cnpj = somente_digitos(empresa.cnpj)
-            
-            # Verificar se existe no JETTAX
-            if cnpj not in jettax_por_cnpj:
-                continue  # Não está cadastrado
+            # Empresa.cnpj já vem só com dígitos (validador do modelo)
+            cliente = jettax_por_cnpj.get(empresa.cnpj)
             
-            cliente = jettax_por_cnpj[cnpj]
+            # Não está cadastrado
+            if cliente is None:
+                continue
             
             # Comparar
             tem_diferencas, diferencas = self.comparar_empresa(empresa, cliente)
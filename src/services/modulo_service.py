@@ -1,13 +1,15 @@
 """
 Serviço de configuração de módulos JETTAX (Federal e Serviços)
 """
-from typing import Dict, Any, Optional
+from typing import Callable, Dict, Any, Optional, Tuple
 from datetime import datetime
 
 from ..models.empresa import Empresa
+from ..models.stats import DetalheModulos, ModulosStats
 from ..core.api_client import JettaxAPI
 from ..utils.logger import get_logger
 from ..utils.cnpj_utils import formatar_cnpj
+from ..utils.lote import executar_em_lote
 
 logger = get_logger()
 
@@ -50,15 +52,15 @@ class ModuloService:
         if status == "valid" or status == "active":
             return True
         
-        if validade:
+        if isinstance(validade, str):
+            # fromisoformat (Python 3.11+) já aceita o sufixo "Z"
             try:
-                # Verificar se ainda não expirou
-                if isinstance(validade, str):
-                    exp_date = datetime.fromisoformat(validade.replace("Z", "+00:00"))
-                    if exp_date > datetime.now():
-                        return True
-            except:
-                pass
+                exp_date = datetime.fromisoformat(validade)
+            except ValueError:
+                return False
+            
+            # Verificar se ainda não expirou (agora com o mesmo fuso da validade, se houver)
+            return exp_date > datetime.now(exp_date.tzinfo)
         
         return False
     
@@ -66,7 +68,8 @@ class ModuloService:
         self,
         client_id: str,
         empresa: Empresa,
-        tem_certificado: bool
+        tem_certificado: bool,
+        cnpj_formatado: Optional[str] = None
     ) -> bool:
         """
         Configura módulo Federal para uma empresa
@@ -75,11 +78,12 @@ class ModuloService:
             client_id: ID do cliente no JETTAX
             empresa: Dados da empresa
             tem_certificado: Se a empresa tem certificado digital
+            cnpj_formatado: CNPJ já formatado pelo chamador (evita formatar de novo)
         
         Returns:
             True se configurado com sucesso
         """
-        cnpj_formatado = formatar_cnpj(empresa.cnpj)
+        cnpj_formatado = cnpj_formatado or formatar_cnpj(empresa.cnpj)
         
         try:
             # Configuração do módulo Federal
@@ -125,7 +129,8 @@ class ModuloService:
         self,
         client_id: str,
         empresa: Empresa,
-        eh_empresa_servicos: bool
+        eh_empresa_servicos: bool,
+        cnpj_formatado: Optional[str] = None
     ) -> bool:
         """
         Configura módulo Serviços para uma empresa
@@ -134,11 +139,12 @@ class ModuloService:
             client_id: ID do cliente no JETTAX
             empresa: Dados da empresa
             eh_empresa_servicos: Se a empresa é de serviços
+            cnpj_formatado: CNPJ já formatado pelo chamador (evita formatar de novo)
         
         Returns:
             True se configurado com sucesso
         """
-        cnpj_formatado = formatar_cnpj(empresa.cnpj)
+        cnpj_formatado = cnpj_formatado or formatar_cnpj(empresa.cnpj)
         
         try:
             # Configuração do módulo Serviços
@@ -189,18 +195,14 @@ class ModuloService:
             cliente_jettax: Dados do cliente no JETTAX
         
         Returns:
-            Dict com status de cada módulo configurado
+            Dict com status de cada módulo configurado ("federal", "servicos") e as
+            condições avaliadas ("tem_certificado", "eh_servicos")
         """
         client_id = cliente_jettax.get("id") or cliente_jettax.get("_id")
         cnpj_formatado = formatar_cnpj(empresa.cnpj)
         
         logger.info(f"[MÓDULOS] Configurando {cnpj_formatado} - {empresa.razao_social}")
         
-        resultado = {
-            "federal": False,
-            "servicos": False
-        }
-        
         # 1. Verificar se tem certificado digital
         tem_certificado = self.empresa_tem_certificado(empresa, cliente_jettax)
         
@@ -212,6 +214,13 @@ class ModuloService:
         # 2. Verificar se é empresa de serviços
         eh_empresa_servicos = empresa.precisa_credenciais_prefeitura()
         
+        resultado = {
+            "federal": False,
+            "servicos": False,
+            "tem_certificado": tem_certificado,
+            "eh_servicos": eh_empresa_servicos
+        }
+        
         if eh_empresa_servicos:
             logger.info(f"  🏢 Tipo: SERVIÇOS (regime: {empresa.tributacao})")
         else:
@@ -221,82 +230,101 @@ class ModuloService:
         resultado["federal"] = self.configurar_modulo_federal(
             client_id,
             empresa,
-            tem_certificado
+            tem_certificado,
+            cnpj_formatado
         )
         
         # 4. Configurar Módulo Serviços
         resultado["servicos"] = self.configurar_modulo_servicos(
             client_id,
             empresa,
-            eh_empresa_servicos
+            eh_empresa_servicos,
+            cnpj_formatado
         )
         
         return resultado
     
+    def _configurar_um(self, empresa: Empresa, cliente: Dict[str, Any]) -> DetalheModulos:
+        """
+        Configura os módulos de uma empresa (unidade do processamento em lote)
+        
+        Args:
+            empresa: Dados da planilha
+            cliente: Dados do cliente no JETTAX
+        
+        Returns:
+            Registro de detalhe para o relatório
+        """
+        try:
+            resultado = self.configurar_modulos_empresa(empresa, cliente)
+            
+            # Condições já avaliadas em configurar_modulos_empresa
+            return {
+                "cnpj": empresa.cnpj,
+                "razao_social": empresa.razao_social,
+                "federal": "ativado" if resultado["tem_certificado"] else "desativado",
+                "servicos": "ativado" if resultado["eh_servicos"] else "desativado",
+                "sucesso": resultado["federal"] and resultado["servicos"]
+            }
+            
+        except Exception as e:
+            logger.error(f"✗ Erro ao processar {formatar_cnpj(empresa.cnpj)}: {e}")
+            
+            return {
+                "cnpj": empresa.cnpj,
+                "razao_social": empresa.razao_social,
+                "federal": "erro",
+                "servicos": "erro",
+                "sucesso": False
+            }
+    
     def configurar_modulos_em_lote(
         self,
-        empresas_com_clientes: list
-    ) -> Dict[str, Any]:
+        empresas_com_clientes: list,
+        max_workers: int = 1,
+        progress: Optional[Callable[[int, int], None]] = None
+    ) -> ModulosStats:
         """
         Configura módulos para múltiplas empresas em lote
         
         Args:
             empresas_com_clientes: Lista de tuplas (empresa, cliente_jettax)
+            max_workers: Número de empresas configuradas simultaneamente
+            progress: Chamado com (concluídas, total) após cada empresa
         
         Returns:
             Estatísticas do processamento
         """
         logger.info(f"Configurando módulos para {len(empresas_com_clientes)} empresas...\n")
         
-        stats = {
+        stats: ModulosStats = {
             "total": len(empresas_com_clientes),
             "federal_ativado": 0,
             "federal_desativado": 0,
             "servicos_ativado": 0,
             "servicos_desativado": 0,
             "erros": 0,
-            "detalhes": []
+            # Tamanho conhecido: preenchida por índice em vez de crescer com append
+            "detalhes": [None] * len(empresas_com_clientes)
         }
         
-        for idx, (empresa, cliente) in enumerate(empresas_com_clientes, 1):
-            logger.info(f"\n[{idx}/{len(empresas_com_clientes)}]")
-            
-            try:
-                resultado = self.configurar_modulos_empresa(empresa, cliente)
-                
-                # Atualizar estatísticas
-                tem_certificado = self.empresa_tem_certificado(empresa, cliente)
-                eh_servicos = empresa.precisa_credenciais_prefeitura()
-                
-                if tem_certificado:
-                    stats["federal_ativado"] += 1
-                else:
-                    stats["federal_desativado"] += 1
-                
-                if eh_servicos:
-                    stats["servicos_ativado"] += 1
-                else:
-                    stats["servicos_desativado"] += 1
-                
-                stats["detalhes"].append({
-                    "cnpj": empresa.cnpj,
-                    "razao_social": empresa.razao_social,
-                    "federal": "ativado" if tem_certificado else "desativado",
-                    "servicos": "ativado" if eh_servicos else "desativado",
-                    "sucesso": resultado["federal"] and resultado["servicos"]
-                })
-                
-            except Exception as e:
-                logger.error(f"✗ Erro ao processar {formatar_cnpj(empresa.cnpj)}: {e}")
+        def processar(item: Tuple[Empresa, Dict[str, Any]]) -> DetalheModulos:
+            return self._configurar_um(*item)
+        
+        detalhes = executar_em_lote(processar, empresas_com_clientes, max_workers)
+        
+        for idx, detalhe in enumerate(detalhes, 1):
+            # Atualizar estatísticas
+            if detalhe["federal"] == "erro":
                 stats["erros"] += 1
-                
-                stats["detalhes"].append({
-                    "cnpj": empresa.cnpj,
-                    "razao_social": empresa.razao_social,
-                    "federal": "erro",
-                    "servicos": "erro",
-                    "sucesso": False
-                })
+            else:
+                stats[f"federal_{detalhe['federal']}"] += 1
+                stats[f"servicos_{detalhe['servicos']}"] += 1
+            
+            stats["detalhes"][idx - 1] = detalhe
+            
+            if progress:
+                progress(idx, len(empresas_com_clientes))
         
         logger.info("\n" + "=" * 60)
         logger.info("RESUMO DA CONFIGURAÇÃO DE MÓDULOS")
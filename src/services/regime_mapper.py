@@ -1,7 +1,9 @@
 """
 Serviço de mapeamento de regimes tributários
 """
-from typing import Dict, Optional
+import logging
+from functools import lru_cache
+from typing import Dict, Iterable, Optional
 from ..utils.logger import get_logger
 
 logger = get_logger()
@@ -37,6 +39,33 @@ REGIME_MAPPING = {
 }
 
 
+# Siglas aceitas como regime completo
+_SIGLAS_REGIME = {
+    "SN": "Simples Nacional",
+    "LP": "Lucro Presumido",
+    "LR": "Lucro Real"
+}
+
+# Palavras-chave (maiúsculas) -> regime no JETTAX, em ordem de prioridade:
+# filiais usam o regime da matriz (default Simples Nacional); imune/isento = Simples Nacional;
+# SIMEI antes de MEI (contém "MEI"); arbitrado = Lucro Presumido
+_REGRAS_REGIME = (
+    ("FILIAL", "Simples Nacional"),
+    ("IMUNE", "Simples Nacional"),
+    ("ISENT", "Simples Nacional"),
+    ("SIMPLES", "Simples Nacional"),
+    ("PRESUMIDO", "Lucro Presumido"),
+    ("REAL", "Lucro Real"),
+    ("SIMEI", "SIMEI"),
+    ("MEI", "MEI"),
+    ("ARBITRADO", "Lucro Presumido")
+)
+
+
+# Regimes de serviços exigem credenciais de prefeitura
+_CHAVES_SERVICOS = ("serviço", "servico", "service")
+
+
 # ObjectIds conhecidos dos regimes (extraídos dos arquivos de captura)
 REGIME_OBJECT_IDS = {
     "Simples Nacional": "60d53314200e556dc277ac20",
@@ -47,10 +76,6 @@ REGIME_OBJECT_IDS = {
 }
 
 
-# Cache de ObjectIds (será preenchido dinamicamente)
-_regime_cache: Dict[str, str] = {}
-
-
 def normalizar_nome_regime(nome: str) -> str:
     """
     Normaliza nome do regime para busca
@@ -61,9 +86,10 @@ def normalizar_nome_regime(nome: str) -> str:
     Returns:
         Nome normalizado
     """
-    return nome.strip().lower()
+    return nome.strip().casefold()
 
 
+@lru_cache(maxsize=256)
 def mapear_regime_planilha_para_jettax(regime_planilha: str) -> str:
     """
     Mapeia regime da planilha para nome no JETTAX
@@ -81,41 +107,21 @@ def mapear_regime_planilha_para_jettax(regime_planilha: str) -> str:
     
     regime = regime_planilha.strip().upper()
     
-    # Filiais usam o regime da matriz
-    if "FILIAL" in regime:
-        return "Simples Nacional"  # Default para filial
-    
-    # Imune/Isento = Simples Nacional
-    if "IMUNE" in regime or "ISENT" in regime:
-        return "Simples Nacional"
-    
-    # Simples Nacional
-    if "SIMPLES" in regime or regime == "SN":
-        return "Simples Nacional"
-    
-    # Lucro Presumido
-    if "PRESUMIDO" in regime or regime == "LP":
-        return "Lucro Presumido"
-    
-    # Lucro Real
-    if "REAL" in regime or regime == "LR":
-        return "Lucro Real"
-    
-    # SIMEI
-    if "SIMEI" in regime:
-        return "SIMEI"
+    # Siglas exatas: SN, LP, LR
+    sigla = _SIGLAS_REGIME.get(regime)
+    if sigla:
+        return sigla
     
-    # MEI
-    if "MEI" in regime and "SIMEI" not in regime:
-        return "MEI"
-    
-    # Arbitrado = Lucro Presumido
-    if "ARBITRADO" in regime:
-        return "Lucro Presumido"
+    # Primeira palavra-chave contida no regime, na ordem de prioridade
+    for chave, regime_jettax in _REGRAS_REGIME:
+        if chave in regime:
+            return regime_jettax
     
     # Se não reconhecer, logar e retornar Simples Nacional como fallback
-    logger.warning(f"Regime '{regime_planilha}' não reconhecido, usando Simples Nacional")
+    logger.warning("Regime '%s' não reconhecido, usando Simples Nacional", regime_planilha)
     return "Simples Nacional"
+
+
 def obter_regime_object_id(
     regime_planilha: str,
     api_client
@@ -130,9 +136,11 @@ def obter_regime_object_id(
     Returns:
         ObjectId do regime ou None se não encontrado
     """
-    # Verificar cache
-    if regime_planilha in _regime_cache:
-        return _regime_cache[regime_planilha]
+    # Sem cache próprio: o mapeamento é memorizado e a busca na API usa os regimes
+    # em cache na própria instância do JettaxAPI (nada é compartilhado entre contas)
+    
+    # Uma checagem de nível para todas as mensagens de debug abaixo
+    debug = logger.isEnabledFor(logging.DEBUG)
     
     # Mapear nome
     regime_jettax = mapear_regime_planilha_para_jettax(regime_planilha)
@@ -141,29 +149,47 @@ def obter_regime_object_id(
     object_id = REGIME_OBJECT_IDS.get(regime_jettax)
     
     if object_id:
-        # Salvar no cache
-        _regime_cache[regime_planilha] = object_id
-        logger.debug(f"Regime '{regime_planilha}' → '{regime_jettax}' → ObjectId: {object_id}")
+        if debug:
+            logger.debug("Regime '%s' → '%s' → ObjectId: %s", regime_planilha, regime_jettax, object_id)
         return object_id
     
     # Se não encontrar nos conhecidos, tentar buscar na API
-    logger.debug(f"Regime '{regime_jettax}' não encontrado nos ObjectIds conhecidos, tentando API...")
+    if debug:
+        logger.debug("Regime '%s' não encontrado nos ObjectIds conhecidos, tentando API...", regime_jettax)
     object_id = api_client.buscar_regime_por_nome(regime_jettax)
     
     if object_id:
-        # Salvar no cache
-        _regime_cache[regime_planilha] = object_id
-        logger.debug(f"Regime '{regime_planilha}' → ObjectId: {object_id}")
+        if debug:
+            logger.debug("Regime '%s' → ObjectId: %s", regime_planilha, object_id)
     else:
-        logger.warning(f"Regime '{regime_planilha}' não encontrado")
+        logger.warning("Regime '%s' não encontrado", regime_planilha)
     
     return object_id
 
 
+def resolver_regimes(
+    regimes_planilha: Iterable[str],
+    api_client
+) -> Dict[str, Optional[str]]:
+    """
+    Resolve de uma vez os regimes distintos de um lote
+    
+    Args:
+        regimes_planilha: Regimes da planilha (repetidos são resolvidos uma vez)
+        api_client: Instância do JettaxAPI
+    
+    Returns:
+        Dict regime da planilha -> ObjectId (None se não encontrado)
+    """
+    return {
+        regime: obter_regime_object_id(regime, api_client)
+        for regime in dict.fromkeys(regimes_planilha)
+    }
+
+
 def limpar_cache():
-    """Limpa o cache de regimes"""
-    global _regime_cache
-    _regime_cache = {}
+    """Limpa o cache de mapeamento de regimes"""
+    mapear_regime_planilha_para_jettax.cache_clear()
 
 
 def regime_exige_credenciais_prefeitura(regime: str) -> bool:
@@ -176,9 +202,6 @@ def regime_exige_credenciais_prefeitura(regime: str) -> bool:
     Returns:
         True se exige credenciais
     """
-    # Regimes de serviços exigem credenciais de prefeitura
-    keywords = ["serviço", "servico", "service"]
-    
-    regime_lower = normalizar_nome_regime(regime)
+    regime_normalizado = normalizar_nome_regime(regime)
     
-    return any(keyword in regime_lower for keyword in keywords)
+    return any(chave in regime_normalizado for chave in _CHAVES_SERVICOS)
@@ -2,16 +2,37 @@
 Utilitários para manipulação de CNPJ/CPF
 """
 import re
+from functools import lru_cache
 from typing import Optional
 
 
+# Separadores usuais de CNPJ/CPF, removidos por tabela de tradução (bem mais rápido que regex)
+_SEPARADORES = str.maketrans("", "", " ./-\t\n\r()")
+_NAO_DIGITO = re.compile(r"\D")
+
+# Funções puras chamadas várias vezes para os mesmos documentos (comparar, cadastrar,
+# atualizar, exibir): memorizadas; alguns milhares de entradas cobrem uma planilha inteira
+CACHE_MAX = 4096
+
+# Pesos dos dígitos verificadores do CNPJ
+_PESOS_CNPJ_1 = (5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2)
+_PESOS_CNPJ_2 = (6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2)
+
+
 def somente_digitos(valor: Optional[str]) -> str:
     """Remove todos os caracteres não numéricos"""
     if valor is None:
         return ""
-    return re.sub(r"\D", "", str(valor))
+    
+    texto = str(valor).translate(_SEPARADORES)
+    if texto.isdecimal():
+        return texto
+    
+    # Caracteres inesperados (letras, outros símbolos): cai para a regex
+    return _NAO_DIGITO.sub("", texto)
 
 
+@lru_cache(maxsize=CACHE_MAX, typed=True)
 def normalizar_cnpj(cnpj: Optional[str]) -> str:
     """
     Normaliza CNPJ para formato de 14 dígitos
@@ -33,6 +54,7 @@ def normalizar_cnpj(cnpj: Optional[str]) -> str:
     return digitos
 
 
+@lru_cache(maxsize=CACHE_MAX, typed=True)
 def formatar_cnpj(cnpj: Optional[str]) -> str:
     """
     Formata CNPJ no padrão 00.000.000/0000-00
@@ -48,9 +70,10 @@ def formatar_cnpj(cnpj: Optional[str]) -> str:
     if len(digitos) != 14:
         return cnpj or ""
     
-    return f"{digitos[0:2]}.{digitos[2:5]}.{digitos[5:8]}/{digitos[8:12]}-{digitos[12:14]}"
+    return "%s.%s.%s/%s-%s" % (digitos[:2], digitos[2:5], digitos[5:8], digitos[8:12], digitos[12:])
 
 
+@lru_cache(maxsize=CACHE_MAX, typed=True)
 def validar_cnpj(cnpj: str) -> bool:
     """
     Valida CNPJ (verifica formato e dígitos verificadores)
@@ -63,37 +86,28 @@ def validar_cnpj(cnpj: str) -> bool:
     """
     digitos = somente_digitos(cnpj)
     
-    # Verifica se tem 14 dígitos
-    if len(digitos) != 14:
+    # Verifica se tem 14 dígitos (ASCII: dígitos de outros alfabetos não formam CNPJ)
+    if len(digitos) != 14 or not digitos.isascii():
         return False
     
     # Verifica se não é sequência repetida (ex: 11111111111111)
-    if len(set(digitos)) == 1:
+    if digitos[0] * 14 == digitos:
         return False
     
-    # Validação dos dígitos verificadores
-    def calcular_digito(cnpj_parcial: str, pesos: list) -> int:
-        soma = sum(int(digitos[i]) * pesos[i] for i in range(len(pesos)))
-        resto = soma % 11
-        return 0 if resto < 2 else 11 - resto
+    # Dígitos como inteiros numa passada (bytes ASCII - ord("0"))
+    numeros = [c - 48 for c in digitos.encode("ascii")]
     
     # Primeiro dígito verificador
-    pesos1 = [5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2]
-    digito1 = calcular_digito(digitos[:12], pesos1)
-    
-    if digito1 != int(digitos[12]):
+    resto = sum(p * n for p, n in zip(_PESOS_CNPJ_1, numeros)) % 11
+    if (0 if resto < 2 else 11 - resto) != numeros[12]:
         return False
     
     # Segundo dígito verificador
-    pesos2 = [6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2]
-    digito2 = calcular_digito(digitos[:13], pesos2)
-    
-    if digito2 != int(digitos[13]):
-        return False
-    
-    return True
+    resto = sum(p * n for p, n in zip(_PESOS_CNPJ_2, numeros)) % 11
+    return (0 if resto < 2 else 11 - resto) == numeros[13]
 
 
+@lru_cache(maxsize=CACHE_MAX, typed=True)
 def normalizar_cpf(cpf: Optional[str]) -> str:
     """
     Normaliza CPF para formato de 11 dígitos
@@ -115,6 +129,7 @@ def normalizar_cpf(cpf: Optional[str]) -> str:
     return digitos
 
 
+@lru_cache(maxsize=CACHE_MAX, typed=True)
 def formatar_cpf(cpf: Optional[str]) -> str:
     """
     Formata CPF no padrão 000.000.000-00
@@ -130,4 +145,10 @@ def formatar_cpf(cpf: Optional[str]) -> str:
     if len(digitos) != 11:
         return cpf or ""
     
-    return f"{digitos[0:3]}.{digitos[3:6]}.{digitos[6:9]}-{digitos[9:11]}"
+    return "%s.%s.%s-%s" % (digitos[:3], digitos[3:6], digitos[6:9], digitos[9:])
+
+
+def limpar_caches() -> None:
+    """Descarta os resultados memorizados das funções de CNPJ/CPF"""
+    for funcao in (normalizar_cnpj, formatar_cnpj, validar_cnpj, normalizar_cpf, formatar_cpf):
+        funcao.cache_clear()
@@ -2,10 +2,20 @@
 Utilitários para manipulação de datas
 """
 from datetime import datetime, date
+from functools import lru_cache
 from typing import Optional, Union
 import re
 
 
+# Formatos aceitos em texto: o padrão escolhe o formato antes do strptime,
+# sem tentar (e descartar via exceção) os que não se aplicam
+_FORMATOS_DATA = (
+    (re.compile(r"\d{4}-\d{1,2}-\d{1,2}"), "%Y-%m-%d"),
+    (re.compile(r"\d{1,2}/\d{1,2}/\d{4}"), "%d/%m/%Y"),
+    (re.compile(r"\d{1,2}-\d{1,2}-\d{4}"), "%d-%m-%Y"),
+)
+
+
 def parse_date(valor: any) -> Optional[date]:
     """
     Converte diversos formatos de data para objeto date
@@ -13,8 +23,8 @@ def parse_date(valor: any) -> Optional[date]:
     Formatos suportados:
     - yyyy-mm-dd
     - dd/mm/yyyy
-    - yyyy-mm-dd HH:MM:SS
-    - Objetos datetime
+    - yyyy-mm-dd HH:MM:SS / yyyy-mm-ddTHH:MM:SS (inclui numpy.datetime64)
+    - Objetos datetime (inclui pd.Timestamp)
     - Objetos date
     
     Args:
@@ -26,41 +36,46 @@ def parse_date(valor: any) -> Optional[date]:
     if not valor:
         return None
     
+    # É um datetime (inclui pd.Timestamp); testado antes de date, que é sua classe base
+    if isinstance(valor, datetime):
+        return valor.date()
+    
     # Já é um objeto date
     if isinstance(valor, date):
         return valor
     
-    # É um datetime
-    if isinstance(valor, datetime):
-        return valor.date()
-    
     # Converter para string
     texto = str(valor).strip()
     
-    # Remover parte de hora se existir
-    texto = texto.split(" ")[0]
-    
-    # Tentar formato yyyy-mm-dd
-    try:
-        return datetime.strptime(texto, "%Y-%m-%d").date()
-    except ValueError:
-        pass
-    
-    # Tentar formato dd/mm/yyyy
-    try:
-        return datetime.strptime(texto, "%d/%m/%Y").date()
-    except ValueError:
-        pass
+    # Remover parte de hora se existir, separada por espaço ou por "T" (ISO 8601,
+    # como em str(numpy.datetime64): "2024-01-15T00:00:00")
+    texto = texto.split("T")[0].split(" ")[0]
     
-    # Tentar formato dd-mm-yyyy
-    try:
-        return datetime.strptime(texto, "%d-%m-%Y").date()
-    except ValueError:
-        pass
+    for padrao, formato in _FORMATOS_DATA:
+        if padrao.fullmatch(texto):
+            # O formato bate, mas a data ainda pode ser inválida (ex.: 31/02/2024)
+            try:
+                return datetime.strptime(texto, formato).date()
+            except ValueError:
+                return None
     
     return None
 
 
+# As mesmas datas se repetem muito entre as empresas de um lote
+CACHE_MAX = 1024
+
+
+@lru_cache(maxsize=CACHE_MAX)
+def _data_br(data: date) -> str:
+    return data.strftime("%d/%m/%Y")
+
+
+@lru_cache(maxsize=CACHE_MAX)
+def _data_iso(data: date) -> str:
+    return data.strftime("%Y-%m-%d")
+
+
 def formatar_data_br(data: Optional[Union[date, datetime]]) -> str:
     """
     Formata data no padrão brasileiro dd/mm/yyyy
@@ -77,7 +92,7 @@ def formatar_data_br(data: Optional[Union[date, datetime]]) -> str:
     if isinstance(data, datetime):
         data = data.date()
     
-    return data.strftime("%d/%m/%Y")
+    return _data_br(data)
 
 
 def formatar_data_iso(data: Optional[Union[date, datetime]]) -> str:
@@ -96,7 +111,7 @@ def formatar_data_iso(data: Optional[Union[date, datetime]]) -> str:
     if isinstance(data, datetime):
         data = data.date()
     
-    return data.strftime("%Y-%m-%d")
+    return _data_iso(data)
 
 
 def data_para_jettax(data: Optional[Union[date, datetime]]) -> str:
@@ -0,0 +1,80 @@
+"""
+Estado da última sincronização planilha -> JETTAX, para execuções incrementais
+"""
+import hashlib
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import orjson
+
+from .logger import get_logger
+
+logger = get_logger()
+
+# Arquivo padrão (ao lado do token salvo pelo JettaxAPI)
+ESTADO_SYNC_FILE = Path.home() / ".jettax" / "sync_state.json"
+
+
+class EstadoSync:
+    """
+    Guarda, por CNPJ, o updatedAt do cliente no JETTAX e a assinatura da linha da planilha
+    da última vez em que os dois foram comparados e estavam iguais
+
+    Se nenhum dos dois mudou desde então, a empresa pode ser dada como sem alteração
+    sem comparar campos nem buscar o cliente completo.
+    """
+
+    def __init__(self, arquivo: Path = ESTADO_SYNC_FILE):
+        """
+        Args:
+            arquivo: Arquivo JSON onde o estado é persistido
+        """
+        self.arquivo = Path(arquivo)
+        self._estado: Dict[str, Dict[str, Any]] = {}
+        self._alterado = False
+
+        try:
+            self._estado = orjson.loads(self.arquivo.read_bytes())
+        except FileNotFoundError:
+            pass
+        except (OSError, orjson.JSONDecodeError) as e:
+            logger.warning(f"Estado de sincronização ignorado ({self.arquivo}): {e}")
+
+    @staticmethod
+    def assinatura(empresa) -> str:
+        """Hash curto dos dados da empresa na planilha"""
+        return hashlib.blake2b(empresa.model_dump_json().encode(), digest_size=8).hexdigest()
+
+    def inalterado(self, cnpj: str, updated_at: Optional[str], assinatura: str) -> bool:
+        """True se cliente e linha da planilha estão como na última comparação sem diferenças"""
+        if not updated_at:
+            return False
+
+        anterior = self._estado.get(cnpj)
+        return (
+            anterior is not None
+            and anterior.get("updatedAt") == updated_at
+            and anterior.get("hash") == assinatura
+        )
+
+    def registrar(self, cnpj: str, updated_at: Optional[str], assinatura: str) -> None:
+        """Marca a empresa como sincronizada (planilha e JETTAX iguais)"""
+        if not updated_at:
+            return
+
+        novo = {"updatedAt": updated_at, "hash": assinatura}
+        if self._estado.get(cnpj) != novo:
+            self._estado[cnpj] = novo
+            self._alterado = True
+
+    def salvar(self) -> None:
+        """Persiste o estado, se algo mudou"""
+        if not self._alterado:
+            return
+
+        try:
+            self.arquivo.parent.mkdir(parents=True, exist_ok=True)
+            self.arquivo.write_bytes(orjson.dumps(self._estado))
+            self._alterado = False
+        except OSError as e:
+            logger.warning(f"Não foi possível salvar o estado de sincronização em {self.arquivo}: {e}")
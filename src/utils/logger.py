@@ -2,6 +2,7 @@
 Sistema de logging configurável
 """
 import logging
+import os
 import sys
 from pathlib import Path
 from datetime import datetime
@@ -23,13 +24,18 @@ class ColoredFormatter(logging.Formatter):
         'CRITICAL': Fore.RED + Style.BRIGHT,
     }
     
+    # Nomes de nível já coloridos, montados uma vez
+    _COLORIDOS = {nome: f"{cor}{nome}{Style.RESET_ALL}" for nome, cor in COLORS.items()}
+    
     def format(self, record):
-        # Adicionar cor ao nome do nível
+        # Adicionar cor ao nome do nível só durante esta formatação: o mesmo record
+        # passa pelos outros handlers (arquivo, Streamlit), que não devem ver os códigos ANSI
         levelname = record.levelname
-        if levelname in self.COLORS:
-            record.levelname = f"{self.COLORS[levelname]}{levelname}{Style.RESET_ALL}"
-        
-        return super().format(record)
+        record.levelname = self._COLORIDOS.get(levelname, levelname)
+        try:
+            return super().format(record)
+        finally:
+            record.levelname = levelname
 
 
 def setup_logger(
@@ -83,7 +89,13 @@ def setup_logger(
     if console:
         console_handler = logging.StreamHandler(sys.stdout)
         console_handler.setLevel(level)
-        console_formatter = ColoredFormatter(log_format, date_format)
+        # Cores só em terminal: saída redirecionada (arquivo, Streamlit, CI) ou NO_COLOR
+        # recebem texto puro, sem códigos ANSI
+        usar_cores = sys.stdout.isatty() and os.environ.get("NO_COLOR") is None
+        if usar_cores:
+            console_formatter = ColoredFormatter(log_format, date_format)
+        else:
+            console_formatter = logging.Formatter(log_format, date_format)
         console_handler.setFormatter(console_formatter)
         logger.addHandler(console_handler)
     
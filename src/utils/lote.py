@@ -0,0 +1,94 @@
+"""
+Utilitários para execução de operações em lote com concorrência limitada
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class RateLimiter:
+    """
+    Espaçamento mínimo entre o início de operações (thread-safe)
+
+    O intervalo é contado a partir do início da operação anterior, não do seu
+    fim: se a própria requisição já demorou mais que o intervalo, não há espera.
+    """
+
+    def __init__(self, intervalo_segundos: float = 0.0):
+        """
+        Args:
+            intervalo_segundos: Intervalo mínimo entre duas liberações consecutivas
+        """
+        self.intervalo = max(0.0, intervalo_segundos)
+        self._lock = threading.Lock()
+        self._proximo = 0.0
+
+    def aguardar(self) -> None:
+        """Bloqueia até que a próxima operação possa ser iniciada"""
+        if self.intervalo <= 0:
+            return
+
+        with self._lock:
+            agora = time.monotonic()
+            espera = self._proximo - agora
+            self._proximo = max(agora, self._proximo) + self.intervalo
+
+        if espera > 0:
+            time.sleep(espera)
+
+
+def executar_em_lote(
+    func: Callable[[T], R],
+    itens: Iterable[T],
+    max_workers: int = 1
+) -> Iterator[R]:
+    """
+    Executa `func` para cada item, preservando a ordem dos resultados
+
+    Com max_workers <= 1 executa sequencialmente na thread atual.
+
+    Args:
+        func: Função aplicada a cada item
+        itens: Itens a processar
+        max_workers: Número máximo de execuções simultâneas
+
+    Returns:
+        Iterador com os resultados, na mesma ordem dos itens
+    """
+    if max_workers <= 1:
+        for item in itens:
+            yield func(item)
+        return
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        yield from executor.map(func, itens)
+
+
+class ProgressoLog:
+    """Registra o progresso de um lote no log, no máximo uma vez por intervalo"""
+
+    def __init__(self, descricao: str, logger: logging.Logger, intervalo_segundos: float = 1.0):
+        """
+        Args:
+            descricao: Texto exibido antes da contagem
+            logger: Logger de destino
+            intervalo_segundos: Intervalo mínimo entre dois registros
+        """
+        self.descricao = descricao
+        self.logger = logger
+        self.intervalo = intervalo_segundos
+        self._ultimo = 0.0
+
+    def __call__(self, atual: int, total: int) -> None:
+        agora = time.monotonic()
+        # O último item sempre é registrado
+        if atual < total and agora - self._ultimo < self.intervalo:
+            return
+
+        self._ultimo = agora
+        self.logger.info("%s: %d/%d", self.descricao, atual, total)
@@ -0,0 +1,86 @@
+"""
+Registro de payloads enviados à API, gravado em segundo plano
+"""
+import atexit
+import queue
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import orjson
+
+from .logger import get_logger
+
+logger = get_logger()
+
+# Diretório padrão dos payloads (lido pelo painel jettax_dashboard.py)
+DEBUG_DIR = Path(__file__).parent.parent.parent / "debug_payloads"
+
+_FIM = object()
+
+
+class PayloadLog:
+    """
+    Acrescenta registros a um único arquivo JSONL por dia (debug_payloads/YYYYMMDD.jsonl)
+
+    A gravação fica numa thread própria: quem registra só enfileira e segue.
+    """
+
+    def __init__(self, diretorio: Path = DEBUG_DIR):
+        """
+        Args:
+            diretorio: Diretório onde o arquivo JSONL é criado
+        """
+        self.diretorio = Path(diretorio)
+        self._fila: "queue.Queue[Any]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def registrar(self, dados: Dict[str, Any]) -> None:
+        """Enfileira um registro para gravação"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._gravar, name="payload-log", daemon=True)
+                self._thread.start()
+                atexit.register(self.fechar)
+
+        self._fila.put(dados)
+
+    def fechar(self) -> None:
+        """Grava o que estiver pendente e encerra a thread de gravação"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+
+        if thread is None:
+            return
+
+        self._fila.put(_FIM)
+        thread.join()
+        atexit.unregister(self.fechar)
+
+    def _gravar(self) -> None:
+        arquivo = self.diretorio / f"{datetime.now():%Y%m%d}.jsonl"
+
+        try:
+            self.diretorio.mkdir(exist_ok=True)
+            f = open(arquivo, "ab", buffering=1 << 16)
+        except OSError as e:
+            logger.warning(f"Não foi possível abrir {arquivo}, payloads descartados: {e}")
+            f = None
+
+        try:
+            while True:
+                dados = self._fila.get()
+                if dados is _FIM:
+                    break
+
+                if f is not None:
+                    try:
+                        f.write(orjson.dumps(dados, default=str) + b"\n")
+                    except (OSError, TypeError) as e:
+                        logger.warning(f"Não foi possível gravar payload em {arquivo}: {e}")
+        finally:
+            if f is not None:
+                f.close()
+                logger.debug(f"📝 Payloads salvos em: {arquivo}")
@@ -1,24 +1,26 @@
 """Aplicação Streamlit para comparar, cadastrar e atualizar clientes no JETTAX 360."""
 from __future__ import annotations
 
+import io
 import logging
 import os
+from collections import deque
+import threading
+import time
 from datetime import datetime
 from pathlib import Path
-from tempfile import NamedTemporaryFile
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, Iterable, List, Tuple, Union
 
 import pandas as pd
 import streamlit as st
 from dotenv import load_dotenv
 
 from src.core.api_client import JettaxAPI
-from src.core.excel_reader import ExcelReader, ExcelReaderError
+from src.core.excel_reader import ExcelReader, ExcelReaderError, formatar_coluna_cnpj
 from src.models.empresa import Empresa
 from src.services.atualizacao_service import AtualizacaoService
 from src.services.cadastro_service import CadastroService
 from src.services.comparacao_service import ComparacaoService
-from src.utils.cnpj_utils import formatar_cnpj
 from src.utils.logger import configurar_logger, get_logger
 
 # Carregar variáveis de ambiente
@@ -32,19 +34,54 @@ logger = get_logger()
 st.set_page_config(page_title="Automação JETTAX 360", layout="wide")
 st.title("Automação JETTAX 360 - Cadastro e Atualização")
 
+# Linhas de log mantidas na sessão (e exibidas no painel)
+LOG_MAX_LINHAS = 200
+# Intervalo mínimo (s) entre dois redesenhos do painel de log
+LOG_INTERVALO_REPINTURA = 0.2
+
 
 class StreamlitLogHandler(logging.Handler):
-    """Handler de log que escreve em um placeholder do Streamlit."""
+    """Handler de log que escreve em um placeholder do Streamlit.
+
+    Registros vindos das threads do lote só são acumulados: o Streamlit só aceita
+    escrita a partir da thread do script, que redesenha em `repintar`.
+    """
 
     def __init__(self, placeholder: st.delta_generator.DeltaGenerator):
         super().__init__()
         self.placeholder = placeholder
+        self.logs = st.session_state.setdefault("log_lines", deque(maxlen=LOG_MAX_LINHAS))
+        self._thread_script = threading.get_ident()
+        self._ultima_repintura = 0.0
+        self._pendente = False
 
     def emit(self, record: logging.LogRecord) -> None:  # pragma: no cover - integração com streamlit
-        msg = self.format(record)
-        logs = st.session_state.setdefault("log_lines", [])
-        logs.append(msg)
-        self.placeholder.text("\n".join(logs[-200:]))
+        self.logs.append(self.format(record))
+        self._pendente = True
+        if threading.get_ident() == self._thread_script:
+            self.repintar()
+
+    def repintar(self, *_: Any) -> None:  # pragma: no cover - integração com streamlit
+        # No máximo um redesenho a cada LOG_INTERVALO_REPINTURA; o que ficar pendente sai no flush
+        agora = time.monotonic()
+        if self._pendente and agora - self._ultima_repintura >= LOG_INTERVALO_REPINTURA:
+            self._pintar(agora)
+
+    def flush(self) -> None:  # pragma: no cover - integração com streamlit
+        if self._pendente and threading.get_ident() == self._thread_script:
+            self._pintar(time.monotonic())
+
+    def _pintar(self, agora: float) -> None:  # pragma: no cover - integração com streamlit
+        self.placeholder.text("\n".join(self.logs))
+        self._ultima_repintura = agora
+        self._pendente = False
+
+
+@st.cache_resource
+def get_api_client() -> JettaxAPI:
+    """Cliente da API compartilhado entre execuções do script (sessão HTTP, pool e token)."""
+
+    return JettaxAPI()
 
 
 def get_default_planilha_path() -> str:
@@ -55,21 +92,35 @@ def get_default_planilha_path() -> str:
     )
 
 
-def preparar_planilha(uploaded_file, default_path: str) -> Path:
-    """Garante que a planilha esteja salva em disco para leitura pelo ExcelReader."""
+def preparar_planilha(uploaded_file, default_path: str) -> Union[Path, io.BytesIO]:
+    """Planilha a ser lida: o upload fica em memória (sem arquivo temporário) ou o caminho informado."""
 
     if uploaded_file:
-        with NamedTemporaryFile(delete=False, suffix=".xlsx") as temp:
-            temp.write(uploaded_file.getbuffer())
-            return Path(temp.name)
+        return io.BytesIO(uploaded_file.getbuffer())
 
     return Path(default_path)
 
 
-def carregar_empresas(planilha_path: Path) -> Tuple[pd.DataFrame, List[Empresa]]:
-    """Lê a planilha e retorna dataframe e lista de empresas normalizadas."""
+def assinatura_planilha(planilha: Union[Path, io.BytesIO]) -> Tuple[int, int]:
+    """(mtime_ns, tamanho) do arquivo; um upload já entra na chave do cache pelo conteúdo."""
+
+    if isinstance(planilha, Path):
+        stat = planilha.stat()
+        return stat.st_mtime_ns, stat.st_size
+    return 0, planilha.getbuffer().nbytes
+
 
-    reader = ExcelReader(str(planilha_path))
+@st.cache_data(show_spinner=False)
+def carregar_empresas(
+    planilha: Union[Path, io.BytesIO], file_stat: Tuple[int, int]
+) -> Tuple[pd.DataFrame, List[Empresa]]:
+    """Lê a planilha e retorna dataframe e lista de empresas normalizadas.
+
+    `file_stat` (mtime_ns, tamanho) entra só na chave do cache: o arquivo só é relido
+    quando muda em disco, não a cada clique ou edição do caminho.
+    """
+
+    reader = ExcelReader(planilha)
     df = reader.carregar()
     empresas = reader.converter_para_empresas()
     return df, empresas
@@ -82,41 +133,43 @@ def limitar_empresas(empresas: List[Empresa], limite: int) -> List[Empresa]:
 
 
 def gerar_relatorio_texto(
-    operacao: str, stats: Dict[str, Any], log_lines: List[str], detalhes: List[Dict[str, Any]] | None = None
-) -> Path:
+    operacao: str, stats: Dict[str, Any], log_lines: Iterable[str], detalhes: List[Dict[str, Any]] | None = None
+) -> Tuple[Path, bytes]:
+    """Grava o relatório em reports/ e devolve o caminho e o conteúdo (para o download)."""
+
     reports_dir = Path("reports")
     reports_dir.mkdir(parents=True, exist_ok=True)
 
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    log_lines = list(log_lines)
     report_path = reports_dir / f"{operacao}_report_{timestamp}.txt"
 
-    with open(report_path, "w", encoding="utf-8") as fp:
-        fp.write(f"Operação: {operacao}\n")
-        fp.write(f"Data/Hora: {timestamp}\n\n")
-        fp.write("Resumo:\n")
-        for chave, valor in stats.items():
-            if chave == "detalhes":
-                continue
-            fp.write(f"- {chave}: {valor}\n")
-
-        if detalhes:
-            fp.write("\nDetalhes:\n")
-            for item in detalhes:
-                fp.write(f"CNPJ: {item.get('cnpj')} - {item.get('razao_social', '')}\n")
-                fp.write(f"  Sucesso: {item.get('sucesso')}\n")
-                if item.get("mensagem"):
-                    fp.write(f"  Mensagem: {item.get('mensagem')}\n")
-                if item.get("diferencas"):
-                    fp.write("  Diferenças:\n")
-                    for diff in item.get("diferencas", []):
-                        fp.write(f"    - {diff}\n")
-                fp.write("\n")
-
-        if log_lines:
-            fp.write("Logs:\n")
-            fp.write("\n".join(log_lines))
-
-    return report_path
+    # Montado em memória e gravado de uma vez
+    linhas = [f"Operação: {operacao}", f"Data/Hora: {timestamp}", "", "Resumo:"]
+    linhas.extend(f"- {chave}: {valor}" for chave, valor in stats.items() if chave != "detalhes")
+
+    if detalhes:
+        linhas.extend(("", "Detalhes:"))
+        for item in detalhes:
+            linhas.append(f"CNPJ: {item.get('cnpj')} - {item.get('razao_social', '')}")
+            linhas.append(f"  Sucesso: {item.get('sucesso')}")
+            if item.get("mensagem"):
+                linhas.append(f"  Mensagem: {item.get('mensagem')}")
+            if item.get("diferencas"):
+                linhas.append("  Diferenças:")
+                linhas.extend(f"    - {diff}" for diff in item["diferencas"])
+            linhas.append("")
+
+    if log_lines:
+        linhas.append("Logs:")
+        linhas.extend(log_lines)
+    else:
+        linhas.append("")
+
+    conteudo = "\n".join(linhas)
+    report_path.write_text(conteudo, encoding="utf-8")
+
+    return report_path, conteudo.encode("utf-8")
 
 
 def anexar_logger_streamlit(placeholder: st.delta_generator.DeltaGenerator) -> StreamlitLogHandler:
@@ -135,36 +188,38 @@ def executar_operacao(
     intervalo: float,
     dry_run: bool,
     log_placeholder: st.delta_generator.DeltaGenerator,
+    max_workers: int = 1,
 ):
     detalhes: List[Dict[str, Any]] = []
     stats: Dict[str, Any] = {}
-    st.session_state["log_lines"] = []
+    st.session_state["log_lines"] = deque(maxlen=LOG_MAX_LINHAS)
     handler = anexar_logger_streamlit(log_placeholder)
 
+    # O cliente sobrevive entre execuções: cada operação parte do catálogo atual do JETTAX
+    api_client.invalidar_cache_clientes()
+
     try:
         if operacao == "comparar":
             comparador = ComparacaoService()
-            clientes = api_client.listar_todos_clientes()
+            clientes = api_client.indice_clientes()
             divergentes = comparador.detectar_empresas_divergentes(empresas, clientes)
 
             st.success(f"Comparação concluída: {len(divergentes)} divergências encontradas.")
 
-            dados = [
-                {
-                    "CNPJ": formatar_cnpj(empresa.cnpj),
-                    "Razão Social": empresa.razao_social,
-                    "Diferenças": "\n".join(diferencas),
-                }
-                for empresa, _, diferencas in divergentes
-            ]
-
-            if dados:
-                st.dataframe(pd.DataFrame(dados))
+            if divergentes:
+                # Colunas montadas numa única passada pelas divergências
+                colunas = zip(
+                    *((empresa.cnpj, empresa.razao_social, "\n".join(diferencas)) for empresa, _, diferencas in divergentes)
+                )
+                tabela = pd.DataFrame(dict(zip(("CNPJ", "Razão Social", "Diferenças"), colunas)))
+                # Máscara aplicada na coluna inteira, não CNPJ a CNPJ
+                tabela["CNPJ"] = formatar_coluna_cnpj(tabela["CNPJ"])
+                st.dataframe(tabela)
 
             stats = {
                 "total_processado": len(empresas),
-                "divergentes": len(dados),
-                "sem_diferencas": len(empresas) - len(dados),
+                "divergentes": len(divergentes),
+                "sem_diferencas": len(empresas) - len(divergentes),
             }
             detalhes = [
                 {
@@ -178,7 +233,9 @@ def executar_operacao(
             ]
         elif operacao == "cadastrar":
             cadastro = CadastroService(api_client, dry_run=dry_run)
-            stats = cadastro.cadastrar_em_lote(empresas, intervalo_segundos=intervalo)
+            stats = cadastro.cadastrar_em_lote(
+                empresas, intervalo_segundos=intervalo, max_workers=max_workers, progress=handler.repintar
+            )
             detalhes = stats.get("detalhes", [])
 
             st.success(
@@ -190,7 +247,9 @@ def executar_operacao(
                 st.dataframe(pd.DataFrame(detalhes))
         elif operacao == "atualizar":
             atualizacao = AtualizacaoService(api_client, dry_run=dry_run)
-            stats = atualizacao.atualizar_em_lote(empresas, intervalo_segundos=intervalo)
+            stats = atualizacao.atualizar_em_lote(
+                empresas, intervalo_segundos=intervalo, max_workers=max_workers, progress=handler.repintar
+            )
             detalhes = stats.get("detalhes", [])
 
             st.success(
@@ -206,17 +265,18 @@ def executar_operacao(
             return
 
         log_lines = list(st.session_state.get("log_lines", []))
-        relatorio = gerar_relatorio_texto(operacao, stats, log_lines, detalhes)
-        with open(relatorio, "rb") as fp:
-            st.download_button(
-                label=f"Baixar relatório ({operacao})", data=fp.read(), file_name=relatorio.name, mime="text/plain"
-            )
+        relatorio, conteudo = gerar_relatorio_texto(operacao, stats, log_lines, detalhes)
+        st.download_button(
+            label=f"Baixar relatório ({operacao})", data=conteudo, file_name=relatorio.name, mime="text/plain"
+        )
 
     except Exception as exc:  # pragma: no cover - feedback ao usuário final
         logger.exception("Erro durante a execução da operação")
         st.error(f"Erro durante a operação de {operacao}: {exc}")
         return
     finally:
+        # Mostra as linhas que a limitação de redesenho ainda não exibiu
+        handler.flush()
         logger.removeHandler(handler)
 
 
@@ -228,6 +288,10 @@ with st.sidebar:
     intervalo = st.number_input(
         "Intervalo entre requisições (segundos)", min_value=0.0, max_value=30.0, value=1.0, step=0.5
     )
+    workers = st.number_input(
+        "Requisições simultâneas", min_value=1, max_value=16, value=4, step=1,
+        help="Empresas processadas em paralelo; o intervalo acima continua valendo entre os inícios",
+    )
     limite_empresas = st.number_input("Limitar número de empresas", min_value=0, value=0, step=1)
 
 st.caption(
@@ -241,25 +305,26 @@ log_placeholder = st.empty()
 
 col1, col2, col3 = st.columns(3)
 
-if "empresas_cache" not in st.session_state:
-    st.session_state.empresas_cache = None
-    st.session_state.planilha_usada = None
+st.session_state.planilha_loaded = False
+st.session_state.setdefault("planilha_usada", None)
+empresas_lidas: List[Empresa] = []
 
 
-def obter_empresas_para_execucao() -> Tuple[pd.DataFrame, List[Empresa], Path]:
-    planilha_path = preparar_planilha(uploaded_file, caminho_padrao)
-    st.session_state.planilha_usada = planilha_path
+def obter_empresas_para_execucao() -> Tuple[pd.DataFrame, List[Empresa], str]:
+    planilha = preparar_planilha(uploaded_file, caminho_padrao)
+    origem = str(planilha) if isinstance(planilha, Path) else "(upload)"
+    st.session_state.planilha_usada = origem
 
-    df, empresas = carregar_empresas(planilha_path)
+    df, empresas = carregar_empresas(planilha, assinatura_planilha(planilha))
     empresas = limitar_empresas(empresas, int(limite_empresas))
-    return df, empresas, planilha_path
+    return df, empresas, origem
 
 
 with st.spinner("Carregando planilha..."):
     try:
-        dataframe, empresas_lidas, planilha_path = obter_empresas_para_execucao()
-        st.session_state.empresas_cache = (dataframe, empresas_lidas)
-        st.write(f"Planilha carregada: {planilha_path}")
+        dataframe, empresas_lidas, origem_planilha = obter_empresas_para_execucao()
+        st.session_state.planilha_loaded = True
+        st.write(f"Planilha carregada: {origem_planilha}")
         st.dataframe(dataframe.head())
     except ExcelReaderError as exc:
         st.error(f"Erro ao ler a planilha: {exc}")
@@ -267,43 +332,46 @@ with st.spinner("Carregando planilha..."):
         st.warning("Informe um caminho válido para a planilha ou faça upload do arquivo.")
 
 
-api_client = JettaxAPI()
+api_client = get_api_client()
 
 if col1.button("Comparar"):
-    if not st.session_state.empresas_cache:
+    if not st.session_state.planilha_loaded:
         st.error("Nenhuma planilha carregada.")
     else:
         executar_operacao(
             "comparar",
-            st.session_state.empresas_cache[1],
+            empresas_lidas,
             api_client,
             intervalo,
             dry_run,
             log_placeholder,
+            int(workers),
         )
 
 if col2.button("Cadastrar novos clientes"):
-    if not st.session_state.empresas_cache:
+    if not st.session_state.planilha_loaded:
         st.error("Nenhuma planilha carregada.")
     else:
         executar_operacao(
             "cadastrar",
-            st.session_state.empresas_cache[1],
+            empresas_lidas,
             api_client,
             intervalo,
             dry_run,
             log_placeholder,
+            int(workers),
         )
 
 if col3.button("Atualizar clientes existentes"):
-    if not st.session_state.empresas_cache:
+    if not st.session_state.planilha_loaded:
         st.error("Nenhuma planilha carregada.")
     else:
         executar_operacao(
             "atualizar",
-            st.session_state.empresas_cache[1],
+            empresas_lidas,
             api_client,
             intervalo,
             dry_run,
             log_placeholder,
+            int(workers),
         )